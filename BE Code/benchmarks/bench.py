@@ -0,0 +1,430 @@
+"""
+Load/benchmark harness for the employee API.
+
+Seeds a synthetic roster into a dedicated Mongo database, drives the routes with
+a configurable concurrency and writes latency percentiles, throughput and peak
+RSS as JSON so runs can be diffed between releases.
+
+    # in-process (ASGI) against a local mongod, 50k employees
+    python benchmarks/bench.py --employees 50000 --output results.json
+
+    # against an already running server (seed its database first)
+    python benchmarks/bench.py --url http://localhost:8000 --server-pid 1234
+
+    # compare two runs
+    python benchmarks/bench.py --compare old.json new.json
+
+Run from the "BE Code" directory. The in-process mode never touches the
+configured database: it uses `--db` (default uk_resource_bench) and drops it
+before seeding.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STREAMS = [("Backend", 35), ("Frontend", 30), ("QA", 20), ("DevOps", 10), ("Data", 5)]
+SKILLS = {
+    "Backend": ["Python", "Java", "Go", "Node", "FastAPI", "Spring", "MongoDB", "PostgreSQL", "Kafka"],
+    "Frontend": ["React", "TypeScript", "Vue", "Angular", "CSS", "Next.js", "Redux"],
+    "QA": ["Selenium", "Cypress", "Playwright", "JMeter", "Postman", "Manual Testing"],
+    "DevOps": ["AWS", "Kubernetes", "Terraform", "Docker", "Azure"],
+    "Data": ["Spark", "SQL", "Airflow", "dbt", "Python"],
+}
+LOCATIONS = ["London", "Manchester", "Leeds", "Edinburgh", "Remote"]
+JOB_TITLES = ["Engineer", "Senior Engineer", "Lead Engineer", "Test Analyst", "Architect"]
+# Stands in for a per-request revision in the bulk_import scenario's file
+REVISION_MARKER = "@revision@"
+
+
+# --- Synthetic roster ---
+
+def synthetic_employee(rng: random.Random, index: int, projects: List[str], today: datetime) -> dict:
+    stream = rng.choices([s for s, _ in STREAMS], weights=[w for _, w in STREAMS])[0]
+    # Project sizes follow a long tail: a few large accounts, many small ones.
+    project = projects[int(len(projects) ** rng.random()) - 1]
+    allocation = 100 if rng.random() < 0.8 else rng.choice([20, 25, 40, 50, 60, 75, 80])
+    roll = rng.random()
+    if roll < 0.05:
+        end_date = None
+    elif roll < 0.15:
+        end_date = today - timedelta(days=rng.randint(1, 60))
+    elif roll < 0.45:
+        end_date = today + timedelta(days=rng.randint(0, 90))
+    else:
+        end_date = today + timedelta(days=rng.randint(91, 540))
+    return {
+        "First name": f"First{index}",
+        "Last name": f"Last{index}",
+        "Line Manager": f"Manager{rng.randint(1, max(1, len(projects) // 2))}",
+        "Project": project,
+        "Open Air ID": [f"OA-{rng.randint(10000, 99999)}"],
+        "Location": rng.choice(LOCATIONS),
+        "Stream": stream,
+        "Tech Skills": rng.sample(SKILLS[stream], k=rng.randint(1, 4)),
+        "Job Title": rng.choice(JOB_TITLES),
+        "Contract / Perm": "Contract" if rng.random() < 0.4 else "Perm",
+        "Billable": "Yes" if rng.random() < 0.85 else "No",
+        "Notes": "" if rng.random() < 0.7 else "Synthetic note " * rng.randint(1, 10),
+        "% Allocation": allocation,
+        "Resource End date": end_date,
+    }
+
+
+def import_file_bytes(rng: random.Random, count: int, projects: List[str], today: datetime, offset: int, marker: str = "") -> bytes:
+    records = []
+    for i in range(count):
+        record = synthetic_employee(rng, offset + i, projects, today)
+        end_date = record["Resource End date"]
+        record["Resource End date"] = end_date.strftime("%d/%m/%Y") if end_date else ""
+        if marker:
+            record["Notes"] = f"{record['Notes']} {marker}".strip()
+        records.append(record)
+    return json.dumps({"resources": records}).encode()
+
+
+async def seed(employees: int, projects: List[str], seed_value: int):
+    from db.db import db, list_collection
+    from db.indexes import ensure_indexes
+    from services.dashboard_counters import rebuild_dashboard_counters
+    from services.normalize import to_storage
+    from services.skills import rebuild_skill_counts
+
+    await db.client.drop_database(db.name)
+    rng = random.Random(seed_value)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    batch = []
+    for i in range(employees):
+        batch.append(to_storage(synthetic_employee(rng, i, projects, today)))
+        if len(batch) == 5000:
+            await list_collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await list_collection.insert_many(batch, ordered=False)
+    await ensure_indexes()
+    await rebuild_skill_counts()
+    await rebuild_dashboard_counters()
+
+
+# --- Measurement ---
+
+class RssSampler:
+    """
+    Tracks the peak RSS during one scenario, of this process or of `pid` when benchmarking
+    a separate server. Reads /proc, so it reports 0 off Linux.
+    """
+
+    def __init__(self, pid: Optional[int] = None):
+        self.pid = pid
+        self.peak_kb = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _read_kb(self) -> int:
+        # Current RSS, so each scenario's peak is its own rather than the process high-water mark.
+        try:
+            with open(f"/proc/{self.pid or 'self'}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    async def _run(self):
+        while True:
+            self.peak_kb = max(self.peak_kb, self._read_kb())
+            await asyncio.sleep(0.05)
+
+    def start(self):
+        self.peak_kb = self._read_kb()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> int:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self.peak_kb = max(self.peak_kb, self._read_kb())
+        return self.peak_kb
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, name: str, make_request: Callable, requests: int, concurrency: int, pid: Optional[int]) -> dict:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    response_bytes = 0
+    snapshot_responses = 0
+    counter = iter(range(requests))
+    sampler = RssSampler(pid)
+
+    async def worker():
+        nonlocal response_bytes, snapshot_responses
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await make_request(client, i)
+                elapsed = time.perf_counter() - started
+                if response.status_code >= 400:
+                    errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                else:
+                    latencies.append(elapsed * 1000)
+                    response_bytes += len(response.content)
+                    # The dashboard answered from the stored snapshot instead of computing.
+                    if "X-Dashboard-Source" in response.headers:
+                        snapshot_responses += 1
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+    sampler.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    peak_kb = await sampler.stop()
+
+    latencies.sort()
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 2),
+            "p95": round(percentile(latencies, 0.95), 2),
+            "p99": round(percentile(latencies, 0.99), 2),
+            "mean": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "avg_response_bytes": round(response_bytes / len(latencies)) if latencies else 0,
+        "snapshot_responses": snapshot_responses,
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+    }
+    print(f"{name:<22} p50={result['latency_ms']['p50']:>9.2f}ms p95={result['latency_ms']['p95']:>9.2f}ms "
+          f"p99={result['latency_ms']['p99']:>9.2f}ms {result['throughput_rps']:>8.2f} rps "
+          f"rss={result['peak_rss_mb']}MB errors={sum(errors.values())}", flush=True)
+    return result
+
+
+# --- Scenarios ---
+
+def build_scenarios(args, projects: List[str]) -> Dict[str, Callable]:
+    rng = random.Random(args.seed + 1)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    page_size = 50
+    last_page = max(1, args.employees // page_size)
+    filters = [
+        {}, {"Stream": "Backend"}, {"Stream": "QA", "allocationStatus": "partial"},
+        {"expiringStatus": "at-risk"}, {"Contract / Perm": "Contract"}, {"Project": projects[0][:6]},
+    ]
+
+    async def list_first_page(client, i):
+        return await client.get("/employees", params={"limit": page_size, **filters[i % len(filters)]})
+
+    async def list_deep_page(client, i):
+        return await client.get("/employees", params={"limit": page_size, "skip": rng.randint(0, last_page) * page_size})
+
+    async def list_with_total(client, i):
+        return await client.get("/employees", params={"limit": page_size, "includeTotal": "true", **filters[i % len(filters)]})
+
+    async def list_cursor_walk(client, i):
+        # Walks ten keyset pages per request; latency is for the whole walk.
+        cursor = ""
+        response = None
+        for _ in range(10):
+            response = await client.get("/employees", params={"limit": page_size, "cursor": cursor})
+            cursor = response.json().get("nextCursor") if response.status_code == 200 else None
+            if not cursor:
+                break
+        return response
+
+    async def count(client, i):
+        return await client.get("/employees/count", params=filters[i % len(filters)])
+
+    async def dashboard(client, i):
+        return await client.get("/dashboard-summary")
+
+    async def skill_distribution(client, i):
+        return await client.get("/skill-distribution")
+
+    async def export_xlsx(client, i):
+        return await client.get("/employees/export-excel", params=filters[i % len(filters)])
+
+    async def export_csv(client, i):
+        return await client.get("/employees/export-excel", params={"format": "csv", **filters[i % len(filters)]})
+
+    # Every request (warmup included) imports a new revision of the same employees, so each
+    # row is a real write rather than a skipped unchanged one. Substituting the revision into
+    # the encoded file keeps building it out of the measured latency.
+    import_template = import_file_bytes(
+        random.Random(args.seed + 2), args.import_size, projects, today, offset=args.employees // 2, marker=REVISION_MARKER
+    )
+    revisions = itertools.count(1)
+
+    async def bulk_import(client, i):
+        payload = import_template.replace(REVISION_MARKER.encode(), f"revision {next(revisions)}".encode())
+        files = {"file": ("roster.json", payload, "application/json")}
+        return await client.post("/employees/bulk-import-file", files=files, params={"stream": "true"})
+
+    return {
+        "list_first_page": list_first_page,
+        "list_deep_page": list_deep_page,
+        "list_with_total": list_with_total,
+        "list_cursor_walk": list_cursor_walk,
+        "count": count,
+        "dashboard": dashboard,
+        "skill_distribution": skill_distribution,
+        "export_xlsx": export_xlsx,
+        "export_csv": export_csv,
+        "bulk_import": bulk_import,
+    }
+
+
+# Heavy scenarios get fewer requests by default so a run stays reasonable at 500k rows.
+HEAVY_SCENARIOS = {"export_xlsx", "export_csv", "bulk_import"}
+
+
+async def run(args) -> dict:
+    import httpx
+
+    projects = [f"Project {chr(65 + i % 26)}{i:03d}" for i in range(args.projects)]
+    results = {}
+    meta = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "employees": args.employees,
+        "projects": args.projects,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "target": args.url or "in-process",
+        "dashboard_path": "as configured on the server",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+    async def drive(client):
+        scenarios = build_scenarios(args, projects)
+        selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+        for name in selected:
+            requests = args.heavy_requests if name in HEAVY_SCENARIOS else args.requests
+            # Warm caches and connection pools so the first request doesn't skew percentiles.
+            await run_scenario(client, name + " (warmup)", scenarios[name], min(args.concurrency, requests), args.concurrency, args.server_pid)
+            results[name] = await run_scenario(client, name, scenarios[name], requests, args.concurrency, args.server_pid)
+
+    timeout = httpx.Timeout(args.timeout)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+            await drive(client)
+    else:
+        from config.config import dashboard_cache_ttl, dashboard_snapshot_fallback_seconds
+        from db.db import connect
+        from routes.main import app
+
+        path = []
+        if dashboard_cache_ttl > 0:
+            path.append(f"cached for {dashboard_cache_ttl:g}s")
+        if dashboard_snapshot_fallback_seconds > 0:
+            path.append(f"snapshot fallback after {dashboard_snapshot_fallback_seconds:g}s")
+        meta["dashboard_path"] = ", ".join(path) or "computed on every request"
+        # Seed before the lifespan starts the migration, snapshot and job loops, so none of
+        # them sees a half-seeded roster. The lifespan reuses this client and closes it.
+        await connect()
+        if not args.skip_seed:
+            print(f"Seeding {args.employees} employees into '{args.db}'...", flush=True)
+            seed_started = time.perf_counter()
+            await seed(args.employees, projects, args.seed)
+            meta["seed_seconds"] = round(time.perf_counter() - seed_started, 2)
+
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+                await drive(client)
+
+    return {"meta": meta, "results": results}
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old_report = json.load(f)
+    with open(new_path) as f:
+        new_report = json.load(f)
+    old, new = old_report["results"], new_report["results"]
+    old_path_used = old_report["meta"].get("dashboard_path")
+    new_path_used = new_report["meta"].get("dashboard_path")
+    if old_path_used != new_path_used:
+        print(f"dashboard path differs: {old_path_used!r} vs {new_path_used!r}")
+    print(f"{'scenario':<22} {'metric':<16} {'old':>10} {'new':>10} {'change':>9}")
+    for name in sorted(set(old) & set(new)):
+        rows = [(f"latency {p}", old[name]["latency_ms"][p], new[name]["latency_ms"][p]) for p in ("p50", "p95", "p99")]
+        rows.append(("throughput_rps", old[name]["throughput_rps"], new[name]["throughput_rps"]))
+        rows.append(("peak_rss_mb", old[name]["peak_rss_mb"], new[name]["peak_rss_mb"]))
+        for metric, before, after in rows:
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"{name:<22} {metric:<16} {before:>10} {after:>10} {change:>9}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=10000)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="requests per light scenario")
+    parser.add_argument("--heavy-requests", type=int, default=10, help="requests per export/import scenario")
+    parser.add_argument("--import-size", type=int, default=5000, help="records per bulk import upload")
+    parser.add_argument("--scenarios", help="comma-separated subset of scenarios to run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--db", default="uk_resource_bench", help="database used by the in-process mode")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the data already in --db")
+    parser.add_argument("--no-cache", action="store_true", help="disable the dashboard cache and snapshot fallback (in-process mode)")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--server-pid", type=int, help="sample peak RSS of this pid instead of the benchmark process")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two result files and exit")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if not args.url:
+        if "bench" not in args.db and not args.skip_seed:
+            sys.exit(f"Refusing to drop and seed '{args.db}': use a database name containing 'bench'.")
+        # Must be set before the app (and its config) is imported.
+        os.environ["mongo_db_name"] = args.db
+        os.environ.setdefault("mongo_uri", "mongodb://localhost:27017")
+        if args.no_cache:
+            # Every dashboard request runs the aggregation: no cached result, no snapshot
+            # answer on slow requests and no snapshot loop competing for the database.
+            os.environ["dashboard_cache_ttl"] = "0"
+            os.environ["dashboard_snapshot_fallback_seconds"] = "0"
+            os.environ["snapshot_interval_minutes"] = "0"
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,114 @@
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 mongo_uri = os.getenv("mongo_uri")
+mongo_db_name = os.getenv("mongo_db_name", "uk_resource")
+
+# Mongo client tuning
+mongo_app_name = os.getenv("mongo_app_name", "resource-management-api")
+mongo_min_pool_size = int(os.getenv("mongo_min_pool_size", "5"))
+mongo_max_pool_size = int(os.getenv("mongo_max_pool_size", "100"))
+mongo_max_idle_time_ms = int(os.getenv("mongo_max_idle_time_ms", "300000"))
+mongo_server_selection_timeout_ms = int(os.getenv("mongo_server_selection_timeout_ms", "5000"))
+mongo_connect_timeout_ms = int(os.getenv("mongo_connect_timeout_ms", "5000"))
+# 0 means no socket timeout
+mongo_socket_timeout_ms = int(os.getenv("mongo_socket_timeout_ms", "60000"))
+# Comma-separated, in order of preference; zstd needs the zstandard package, snappy python-snappy
+mongo_compressors = os.getenv("mongo_compressors", "zstd,zlib")
+# Used by read-only routes: primary, primaryPreferred, secondary, secondaryPreferred or nearest
+mongo_read_preference = os.getenv("mongo_read_preference", "primary")
+
+# Bulk import tuning
+bulk_import_batch_size = int(os.getenv("bulk_import_batch_size", "1000"))
+bulk_import_concurrency = int(os.getenv("bulk_import_concurrency", "4"))
+
+# Export tuning
+export_batch_size = int(os.getenv("export_batch_size", "500"))
+
+# CPU-bound work (workbook generation, import parsing) runs on a bounded thread pool.
+# At most cpu_job_limit exports/imports run at once per worker; further requests wait up
+# to cpu_job_queue_timeout seconds for a slot and then get a 429.
+cpu_pool_workers = int(os.getenv("cpu_pool_workers", str(min(4, os.cpu_count() or 1))))
+cpu_job_limit = int(os.getenv("cpu_job_limit", str(cpu_pool_workers)))
+cpu_job_queue_timeout = float(os.getenv("cpu_job_queue_timeout", "5"))
+
+# Background jobs: uploads and export artifacts live under job_storage_dir on local disk.
+job_storage_dir = os.getenv("job_storage_dir", os.path.join(tempfile.gettempdir(), "resource-management-jobs"))
+job_heartbeat_seconds = float(os.getenv("job_heartbeat_seconds", "2"))
+# An unfinished job without a heartbeat for this long is taken over by another worker
+job_stale_after_seconds = float(os.getenv("job_stale_after_seconds", "30"))
+job_max_attempts = int(os.getenv("job_max_attempts", "3"))
+# Finished jobs and their files are removed after this many hours
+job_retention_hours = float(os.getenv("job_retention_hours", "24"))
+
+# Live updates (/live): change streams need a replica set; a standalone mongod is polled instead,
+# through a change counter the API's write paths bump (writes made outside the API aren't seen),
+# and clients are told to refetch rather than sent row deltas.
+live_poll_interval = float(os.getenv("live_poll_interval", "5"))
+# Changes arriving within this many seconds go out as one event
+live_batch_window = float(os.getenv("live_batch_window", "0.25"))
+# Bigger bursts (e.g. a bulk import) send only the summary and tell clients to refetch rows
+live_max_rows_per_event = int(os.getenv("live_max_rows_per_event", "500"))
+live_keepalive_seconds = float(os.getenv("live_keepalive_seconds", "15"))
+# Events buffered per client; a client that falls further behind is told to resync
+live_subscriber_queue = int(os.getenv("live_subscriber_queue", "100"))
+
+# Read cache tuning (seconds, 0 disables caching but keeps request coalescing)
+dashboard_cache_ttl = float(os.getenv("dashboard_cache_ttl", "60"))
+# Capacity projections are also dropped on every write this worker sees; the TTL bounds
+# how stale they get after writes handled by other workers
+planner_cache_ttl = float(os.getenv("planner_cache_ttl", "600"))
+# Serve today's snapshot when computing the dashboard takes longer than this (seconds, 0 always waits)
+dashboard_snapshot_fallback_seconds = float(os.getenv("dashboard_snapshot_fallback_seconds", "2"))
+
+# Daily snapshots: today's rollup is rewritten this often (minutes, 0 disables the job)
+snapshot_interval_minutes = float(os.getenv("snapshot_interval_minutes", "60"))
+# Longest date range /trends returns
+trends_max_days = int(os.getenv("trends_max_days", "366"))
+
+# Response encoding: bodies smaller than this many bytes are sent uncompressed
+compression_minimum_size = int(os.getenv("compression_minimum_size", "1024"))
+gzip_compress_level = int(os.getenv("gzip_compress_level", "6"))
+# Brotli (when installed) is preferred over gzip; 4 is fast enough for per-request use
+brotli_quality = int(os.getenv("brotli_quality", "4"))
+# ETag / If-None-Match on JSON GET responses
+etag_enabled = os.getenv("etag_enabled", "true").lower() == "true"
+
+# Index provisioning and query diagnostics
+create_indexes_on_startup = os.getenv("create_indexes_on_startup", "true").lower() == "true"
+# Index builds and migrations in the background after startup; one worker claims them per server start
+run_startup_tasks = os.getenv("run_startup_tasks", "true").lower() == "true"
+# Set by serve.py so its workers recognise one server start; leave unset
+startup_run_id = os.getenv("startup_run_id", "")
+query_explain_enabled = os.getenv("query_explain_enabled", "false").lower() == "true"
+
+# Instrumentation
+server_timing_enabled = os.getenv("server_timing_enabled", "true").lower() == "true"
+# Log Mongo commands slower than this many milliseconds (0 disables the slow-query log)
+slow_query_log_ms = float(os.getenv("slow_query_log_ms", "0"))
+# Re-run slow reads with explain() to record how many documents they examined
+slow_query_explain = os.getenv("slow_query_explain", "false").lower() == "true"
+metrics_mongo_payload_sizes = os.getenv("metrics_mongo_payload_sizes", "false").lower() == "true"
+# Set by serve.py when it runs several workers: each one writes its metrics to a file here every
+# metrics_flush_seconds, and /metrics on any worker serves the sum of all of them
+metrics_multiprocess_dir = os.getenv("metrics_multiprocess_dir", "")
+metrics_flush_seconds = float(os.getenv("metrics_flush_seconds", "5"))
+
+# Production server (serve.py)
+server_host = os.getenv("server_host", "0.0.0.0")
+server_port = int(os.getenv("server_port", "8000"))
+# 0 means one worker per CPU
+server_workers = int(os.getenv("server_workers", "0")) or os.cpu_count() or 1
+# auto picks uvloop / httptools when installed and falls back to asyncio / h11
+server_loop = os.getenv("server_loop", "auto")
+server_http = os.getenv("server_http", "auto")
+server_backlog = int(os.getenv("server_backlog", "2048"))
+server_keep_alive = int(os.getenv("server_keep_alive", "5"))
+# Seconds a stopping worker waits for in-flight requests before closing them
+server_graceful_shutdown = int(os.getenv("server_graceful_shutdown", "30"))
+# Recycle a worker after this many requests (0 disables)
+server_limit_max_requests = int(os.getenv("server_limit_max_requests", "0"))
+# Answer 503 once a worker has this many open connections/tasks (0 disables)
+server_limit_concurrency = int(os.getenv("server_limit_concurrency", "0"))
@@ -1,10 +1,126 @@
-from config.config import mongo_uri
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
+from typing import Optional
 
-# Use the async client
-client = AsyncIOMotorClient(mongo_uri)
+from config.config import (
+    mongo_uri, mongo_db_name, mongo_app_name, mongo_min_pool_size, mongo_max_pool_size,
+    mongo_max_idle_time_ms, mongo_server_selection_timeout_ms, mongo_connect_timeout_ms,
+    mongo_socket_timeout_ms, mongo_compressors, mongo_read_preference
+)
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ReadPreference
+from services.metrics import mongo_command_listener
 
-# Access a database
-db = client["uk_resource"]
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
 
-list_collection=db["list_collection"]
+# The client is created by connect() on app startup, inside each worker process,
+# rather than at import time; the proxies below resolve against it lazily.
+_client: Optional[AsyncIOMotorClient] = None
+_database: Optional[AsyncIOMotorDatabase] = None
+
+
+def get_client() -> AsyncIOMotorClient:
+    if _client is None:
+        raise RuntimeError("MongoDB client is not connected; db.db.connect() runs on app startup")
+    return _client
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    get_client()
+    return _database
+
+
+async def connect() -> AsyncIOMotorClient:
+    global _client, _database
+    if _client is not None:
+        return _client
+    if mongo_read_preference not in READ_PREFERENCES:
+        raise ValueError(f"Unknown mongo_read_preference '{mongo_read_preference}'")
+
+    options = {
+        "appname": mongo_app_name,
+        "minPoolSize": mongo_min_pool_size,
+        "maxPoolSize": mongo_max_pool_size,
+        "maxIdleTimeMS": mongo_max_idle_time_ms,
+        "serverSelectionTimeoutMS": mongo_server_selection_timeout_ms,
+        "connectTimeoutMS": mongo_connect_timeout_ms,
+        "socketTimeoutMS": mongo_socket_timeout_ms or None,
+        # The listener feeds per-command timings into /metrics
+        "event_listeners": [mongo_command_listener],
+    }
+    if mongo_compressors:
+        options["compressors"] = mongo_compressors
+
+    # Use the async client
+    _client = AsyncIOMotorClient(mongo_uri, **options)
+    # Access a database
+    _database = _client[mongo_db_name]
+
+    # Fail fast on a bad URI or unreachable cluster, and open the minimum pool
+    # now so the first requests don't pay for connection setup.
+    await _client.admin.command("ping")
+    if mongo_min_pool_size > 1:
+        await asyncio.gather(*(_client.admin.command("ping") for _ in range(mongo_min_pool_size)))
+    return _client
+
+
+def close():
+    global _client, _database
+    if _client is not None:
+        _client.close()
+    _client = None
+    _database = None
+
+
+class _DatabaseProxy:
+    name = mongo_db_name
+
+    def __getattr__(self, attr):
+        return getattr(get_database(), attr)
+
+    def __getitem__(self, name):
+        return get_database()[name]
+
+
+class _CollectionProxy:
+    def __init__(self, name: str, read_preference: Optional[str] = None):
+        self.name = name
+        self.read_preference = read_preference
+        self._resolved = None
+        self._resolved_for = None
+
+    def _collection(self):
+        database = get_database()
+        # Re-resolve after a reconnect; otherwise reuse the Motor collection object.
+        if self._resolved_for is not database:
+            if self.read_preference and self.read_preference != "primary":
+                self._resolved = database.get_collection(self.name, read_preference=READ_PREFERENCES[self.read_preference])
+            else:
+                self._resolved = database[self.name]
+            self._resolved_for = database
+        return self._resolved
+
+    def __getattr__(self, attr):
+        return getattr(self._collection(), attr)
+
+
+db = _DatabaseProxy()
+
+list_collection = _CollectionProxy("list_collection")
+# Read-only routes go through this handle so they can be routed to secondaries.
+list_read_collection = _CollectionProxy("list_collection", mongo_read_preference)
+# Materialized (stream, skill) headcounts, maintained from list_collection writes
+skill_counts_collection = _CollectionProxy("skill_counts")
+# Headcount counters behind the live dashboard summary, maintained the same way (services/dashboard_counters.py)
+dashboard_counters_collection = _CollectionProxy("dashboard_counters")
+# Background import/export jobs (services/jobs.py)
+jobs_collection = _CollectionProxy("jobs")
+# One dashboard rollup per day, keyed by the date (services/snapshots.py)
+snapshots_collection = _CollectionProxy("daily_snapshots")
+# Small bookkeeping documents, such as the roster change counter (services/roster.py)
+meta_collection = _CollectionProxy("app_meta")
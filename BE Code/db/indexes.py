@@ -0,0 +1,148 @@
+import json
+import logging
+from typing import Any, List
+
+from bson import json_util
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from db.db import db, jobs_collection, list_collection, skill_counts_collection
+
+logger = logging.getLogger(__name__)
+
+NAME_INDEX = "first_last_unique"
+_INDEX_NOT_FOUND = 27
+
+# Equality filters first, then the first_name / _id sort, then range filters,
+# matching the combinations build_query and get_employees actually send.
+LIST_COLLECTION_INDEXES: List[IndexModel] = [
+    IndexModel(
+        [("first_name", ASCENDING), ("last_name", ASCENDING)],
+        name=NAME_INDEX,
+        unique=True,
+        # Only named employees are upsert targets; unnamed ones must not collide on null.
+        partialFilterExpression={"first_name": {"$type": "string"}, "last_name": {"$type": "string"}}
+    ),
+    IndexModel([("stream", ASCENDING), ("first_name", ASCENDING), ("_id", ASCENDING)], name="stream_first_name_id"),
+    IndexModel([("contract_perm", ASCENDING), ("first_name", ASCENDING), ("_id", ASCENDING)], name="contract_first_name_id"),
+    IndexModel([("project_key", ASCENDING), ("first_name", ASCENDING), ("_id", ASCENDING)], name="project_key_first_name_id"),
+    IndexModel([("project_key", ASCENDING), ("stream", ASCENDING)], name="project_key_stream"),
+    IndexModel([("stream", ASCENDING), ("resource_end_date", ASCENDING)], name="stream_end_date"),
+    IndexModel([("stream", ASCENDING), ("allocation", ASCENDING)], name="stream_allocation"),
+    # Every list sort is (column, _id); these also serve the range filters on their leading field.
+    IndexModel([("first_name", ASCENDING), ("_id", ASCENDING)], name="first_name_id"),
+    IndexModel([("resource_end_date", ASCENDING), ("_id", ASCENDING)], name="end_date_id"),
+    IndexModel([("allocation", ASCENDING), ("_id", ASCENDING)], name="allocation_id"),
+    IndexModel([("project", ASCENDING), ("_id", ASCENDING)], name="project_id"),
+    IndexModel([("stream", ASCENDING), ("_id", ASCENDING)], name="stream_id"),
+    IndexModel([("contract_perm", ASCENDING), ("_id", ASCENDING)], name="contract_id"),
+    IndexModel([("job_title", ASCENDING), ("_id", ASCENDING)], name="job_title_id"),
+    IndexModel([("skill_keys", ASCENDING), ("stream", ASCENDING), ("first_name", ASCENDING)], name="skill_keys_stream"),
+    # Documents still in an older schema: the migration's scan, and the import's lookups while it runs.
+    IndexModel([("schema_version", ASCENDING)], name="schema_version"),
+    # Backs the free-text `search` filter; a collection can only have one text index.
+    IndexModel(
+        [("first_name", TEXT), ("last_name", TEXT), ("project", TEXT), ("tech_skills", TEXT)],
+        name="employee_text",
+        default_language="none"
+    ),
+]
+
+# Indexes earlier releases created that nothing queries any more; dropped so writes stop paying for them.
+RETIRED_LIST_COLLECTION_INDEXES = ["open_air_id"]
+
+SKILL_COUNTS_INDEXES: List[IndexModel] = [
+    IndexModel([("stream", ASCENDING), ("count", DESCENDING)], name="stream_count"),
+]
+
+JOBS_INDEXES: List[IndexModel] = [
+    # The sweeper looks for unfinished jobs whose heartbeat has gone stale, and for old finished ones.
+    IndexModel([("status", ASCENDING), ("heartbeat_at", ASCENDING)], name="status_heartbeat"),
+    IndexModel([("status", ASCENDING), ("finished_at", ASCENDING)], name="status_finished"),
+    IndexModel([("created_at", DESCENDING)], name="created_at"),
+]
+
+
+def _index_keys(spec: dict) -> Any:
+    # Text indexes are reported as _fts/_ftsx keys; their fields are in the weights.
+    if "weights" in spec:
+        return sorted(spec["weights"])
+    keys = list(spec["key"].items()) if isinstance(spec["key"], dict) else list(spec["key"])
+    if any(direction == TEXT for _, direction in keys):
+        return sorted(field for field, direction in keys if direction == TEXT)
+    return keys
+
+
+async def _drop_changed_indexes(collection, indexes: List[IndexModel]):
+    # create_indexes fails on a name that already exists with different keys (such as the
+    # indexes over the pre-migration field names), so those are dropped and rebuilt.
+    existing = await collection.index_information()
+    for index in indexes:
+        name = index.document["name"]
+        if name in existing and _index_keys(existing[name]) != _index_keys(index.document):
+            logger.info("Rebuilding index %s on %s with new keys", name, collection.name)
+            try:
+                await collection.drop_index(name)
+            except OperationFailure as e:
+                # Another instance starting at the same time dropped it first.
+                if e.code != _INDEX_NOT_FOUND:
+                    raise
+
+
+async def _drop_retired_indexes(collection, names: List[str]):
+    existing = await collection.index_information()
+    for name in names:
+        if name in existing:
+            logger.info("Dropping unused index %s on %s", name, collection.name)
+            try:
+                await collection.drop_index(name)
+            except OperationFailure as e:
+                if e.code != _INDEX_NOT_FOUND:
+                    raise
+
+
+async def ensure_indexes():
+    await _drop_retired_indexes(list_collection, RETIRED_LIST_COLLECTION_INDEXES)
+    await _drop_changed_indexes(list_collection, LIST_COLLECTION_INDEXES)
+    try:
+        await list_collection.create_indexes(LIST_COLLECTION_INDEXES)
+    except OperationFailure as e:
+        # Usually existing duplicate names blocking the unique index; keep the rest available.
+        logger.warning("Index creation failed (%s); retrying without the unique name index", e)
+        fallback = [index for index in LIST_COLLECTION_INDEXES if index.document["name"] != NAME_INDEX]
+        fallback.append(IndexModel([("first_name", ASCENDING), ("last_name", ASCENDING)], name="first_last"))
+        await list_collection.create_indexes(fallback)
+    await skill_counts_collection.create_indexes(SKILL_COUNTS_INDEXES)
+    await jobs_collection.create_indexes(JOBS_INDEXES)
+
+
+def _to_plain(document: Any) -> Any:
+    # Plans embed BSON values (dates, ObjectIds) from the query; render them as extended JSON.
+    return json.loads(json_util.dumps(document, json_options=json_util.RELAXED_JSON_OPTIONS))
+
+
+def summarize_explain(explain: dict) -> dict:
+    planner = explain.get("queryPlanner") or {}
+    stats = explain.get("executionStats") or {}
+    return _to_plain({
+        "winningPlan": planner.get("winningPlan"),
+        "rejectedPlans": len(planner.get("rejectedPlans", [])),
+        "nReturned": stats.get("nReturned"),
+        "totalKeysExamined": stats.get("totalKeysExamined"),
+        "totalDocsExamined": stats.get("totalDocsExamined"),
+        "executionTimeMillis": stats.get("executionTimeMillis")
+    })
+
+
+async def explain_find(query: dict, sort: list, skip: int = 0, limit: int = 0) -> dict:
+    command = {"find": list_collection.name, "filter": query, "sort": dict(sort), "skip": skip}
+    if limit:
+        command["limit"] = limit
+    explain = await db.command({"explain": command, "verbosity": "executionStats"})
+    return summarize_explain(explain)
+
+
+async def explain_count(query: dict) -> dict:
+    command = {"count": list_collection.name, "query": query}
+    explain = await db.command({"explain": command, "verbosity": "executionStats"})
+    return summarize_explain(explain)
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from config.config import create_indexes_on_startup, startup_run_id
+from db.db import dashboard_counters_collection, list_collection, meta_collection, skill_counts_collection
+from db.indexes import ensure_indexes
+from models.models import SCHEMA_VERSION
+from services.cache import invalidate_caches
+from services.roster import mark_roster_changed
+from services.dashboard_counters import rebuild_dashboard_counters
+from services.normalize import add_derived_fields, upgrade_document
+from services.skills import rebuild_skill_counts
+
+logger = logging.getLogger(__name__)
+
+_migration_task: Optional[asyncio.Task] = None
+
+_STARTUP_TASKS = "startup_tasks"
+_STARTUP_LEASE = timedelta(minutes=30)
+_STARTUP_POLL_SECONDS = 5
+# serve.py hands every worker of one server start the same id; a lone process makes its own.
+_RUN_ID = startup_run_id or uuid.uuid4().hex
+
+_MISSING_DERIVED_FIELDS = {"$or": [{"project_key": {"$exists": False}}, {"skill_keys": {"$exists": False}}]}
+_OUTDATED_SCHEMA = {"schema_version": {"$ne": SCHEMA_VERSION}}
+
+
+async def _write_upgrades(operations: list) -> int:
+    try:
+        result = await list_collection.bulk_write(operations, ordered=False)
+        modified = result.modified_count
+    except BulkWriteError as e:
+        # Typically two legacy rows for the same person colliding on the unique name index;
+        # they stay in the old schema (still readable) until one of them is removed.
+        logger.warning("Schema migration left %d documents unconverted: %s",
+                       len(e.details.get("writeErrors", [])), e.details.get("writeErrors", [])[:3])
+        modified = e.details.get("nModified", 0)
+    if modified:
+        await mark_roster_changed()
+    return modified
+
+
+async def migrate_schema(batch_size: int = 1000) -> int:
+    # Rewrites documents stored under the API's field names into the canonical schema.
+    updated = 0
+    operations = []
+    async for doc in list_collection.find(_OUTDATED_SCHEMA):
+        try:
+            upgraded = upgrade_document(doc)
+        except ValueError:
+            logger.warning("Schema migration skipped document %s: unparseable values", doc["_id"])
+            continue
+        # The version guard skips documents a concurrent write has already converted.
+        operations.append(ReplaceOne({"_id": doc["_id"], **_OUTDATED_SCHEMA}, upgraded))
+        if len(operations) >= batch_size:
+            updated += await _write_upgrades(operations)
+            operations = []
+    if operations:
+        updated += await _write_upgrades(operations)
+    return updated
+
+
+async def backfill_derived_fields(batch_size: int = 1000) -> int:
+    # Documents written before the derived fields existed can't be found by the indexed filters.
+    updated = 0
+    operations = []
+    async for doc in list_collection.find(_MISSING_DERIVED_FIELDS, {"project": 1, "tech_skills": 1}):
+        derived = add_derived_fields({"project": doc.get("project"), "tech_skills": doc.get("tech_skills")})
+        # Re-checking the missing fields skips documents a concurrent write has already normalized.
+        operations.append(UpdateOne({"_id": doc["_id"], **_MISSING_DERIVED_FIELDS}, {"$set": derived}))
+        if len(operations) >= batch_size:
+            await list_collection.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations:
+        await list_collection.bulk_write(operations, ordered=False)
+        updated += len(operations)
+    if updated:
+        await mark_roster_changed()
+    return updated
+
+
+async def recount_skills(documents_changed: bool):
+    # Writes keep the counts current with deltas. The full recount swaps the collection under
+    # any $inc running at the same time, so it only runs on first start or after a migration
+    # above rewrote documents.
+    if documents_changed or not await skill_counts_collection.estimated_document_count():
+        await rebuild_skill_counts()
+
+
+async def recount_dashboard_counters(documents_changed: bool):
+    # Same rule as the skill counts: a rewrite can coerce the counted values, such as a
+    # text allocation becoming a number.
+    if documents_changed or not await dashboard_counters_collection.estimated_document_count():
+        await rebuild_dashboard_counters()
+
+
+MIGRATIONS = [migrate_schema, backfill_derived_fields]
+
+
+async def run_migrations():
+    documents_changed = False
+    for migration in MIGRATIONS:
+        try:
+            count = await migration()
+            if count:
+                documents_changed = True
+                logger.info("Migration %s updated %d documents", migration.__name__, count)
+        except Exception:
+            logger.exception("Migration %s failed", migration.__name__)
+    try:
+        await recount_skills(documents_changed)
+    except Exception:
+        logger.exception("Skill recount failed")
+    try:
+        await recount_dashboard_counters(documents_changed)
+    except Exception:
+        logger.exception("Dashboard counter recount failed")
+    # Queries use the canonical field names, so anything cached before now may have missed
+    # documents that were still in the old schema.
+    invalidate_caches()
+
+
+async def _claim_startup_tasks() -> bool:
+    """
+    Takes the lease on this server start's index builds and migrations if nobody holds it
+    and they haven't completed for this start yet. As with the snapshot refresh, losing the
+    race surfaces as the upsert colliding with the existing marker.
+    """
+    now = datetime.now()
+    pending = {"$or": [{"run_id": {"$ne": _RUN_ID}}, {"done": {"$ne": True}}]}
+    free = {"$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lt": now}}]}
+    try:
+        await meta_collection.update_one(
+            {"_id": _STARTUP_TASKS, "$and": [pending, free]},
+            {"$set": {"run_id": _RUN_ID, "done": False, "started_at": now, "lease_until": now + _STARTUP_LEASE}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def _startup_tasks_done() -> bool:
+    marker = await meta_collection.find_one({"_id": _STARTUP_TASKS})
+    return bool(marker and marker.get("run_id") == _RUN_ID and marker.get("done"))
+
+
+async def run_startup_tasks():
+    # Every worker runs this; one claims the work and the others wait for its marker, so
+    # wait_for_migrations() means the same thing in all of them. Requests are served
+    # throughout: reads handle both schemas.
+    while True:
+        if await _claim_startup_tasks():
+            try:
+                if create_indexes_on_startup:
+                    await ensure_indexes()
+                await run_migrations()
+            except Exception:
+                logger.exception("Startup tasks failed")
+                # Lets another worker retry instead of waiting out the lease.
+                await meta_collection.update_one({"_id": _STARTUP_TASKS}, {"$unset": {"lease_until": ""}})
+                return
+            await meta_collection.update_one(
+                {"_id": _STARTUP_TASKS},
+                {"$set": {"done": True, "finished_at": datetime.now()}, "$unset": {"lease_until": ""}}
+            )
+            return
+        if await _startup_tasks_done():
+            return
+        await asyncio.sleep(_STARTUP_POLL_SECONDS)
+
+
+def start_migrations():
+    # Runs in the background so index builds and a large backfill don't hold up startup.
+    global _migration_task
+    _migration_task = asyncio.create_task(run_startup_tasks())
+
+
+async def wait_for_migrations():
+    # Returns once this server start's migrations have finished, in whichever worker ran them.
+    if _migration_task is not None:
+        await asyncio.wait([_migration_task])
+
+
+async def stop_migrations():
+    if _migration_task and not _migration_task.done():
+        _migration_task.cancel()
+        try:
+            await _migration_task
+        except asyncio.CancelledError:
+            pass
@@ -28,4 +28,9 @@ class Employee(BaseModel):
         # This ensures that when converting the model to a dict, it uses the aliases
         json_encoders = {
             datetime: lambda v: v.strftime("%Y-%m-%d") if v else None
-        }
\ No newline at end of file
+        }
+
+# Documents are stored under the model's own field names with strict types; the aliases
+# above are the API's field names and are only used at the boundary (services/normalize.py).
+SCHEMA_VERSION = 2
+STORAGE_FIELDS = {field.alias: name for name, field in Employee.model_fields.items() if name != "countdown"}
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import shutil
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile
+from fastapi.responses import FileResponse
+
+from config.config import export_batch_size
+from db.db import jobs_collection, list_read_collection
+from routes.manage import build_query
+from services.bulk_import import bulk_upsert, process_on_cpu_pool
+from services.cache import invalidate_caches
+from services.export import CSV_MEDIA_TYPE, EXPORT_PROJECTION, XLSX_MEDIA_TYPE, build_xlsx, csv_chunk, stream_csv
+from services.jobs import (
+    COMPLETED, cancel_job, get_job, job_file_path, job_helper, register_job_runner, submit_job
+)
+from services.json_stream import iter_json_array_items
+
+router = APIRouter()
+
+
+class _CountingCursor:
+    # Counts rows as the export pulls batches, for the job's progress.
+    def __init__(self, cursor, progress: dict):
+        self.cursor = cursor
+        self.progress = progress
+        progress["rows_exported"] = 0
+
+    async def to_list(self, length: int):
+        batch = await self.cursor.to_list(length=length)
+        self.progress["rows_exported"] += len(batch)
+        return batch
+
+
+async def run_import_job(job: dict, progress: dict) -> dict:
+    progress.update(rows_parsed=0, created_count=0, updated_count=0, failed_count=0)
+
+    def on_batch(result: dict):
+        for field in ("created_count", "updated_count", "failed_count"):
+            progress[field] += result[field]
+
+    with open(job["input_path"], "rb") as f:
+        upload = UploadFile(file=f, filename=job["params"]["filename"])
+
+        async def records_from_upload():
+            async for record in iter_json_array_items(upload, "resources"):
+                progress["rows_parsed"] += 1
+                yield record
+
+        changed = True
+        try:
+            summary = await bulk_upsert(
+                process_on_cpu_pool(records_from_upload()), on_batch=on_batch, sync=job["params"].get("sync", False)
+            )
+            changed = any(summary[field] for field in ("created_count", "updated_count", "deleted_count"))
+        finally:
+            if changed:
+                invalidate_caches()
+
+    return {"result": {
+        "message": f"Successfully processed {progress['rows_parsed']} records.",
+        "unchanged_count": summary["unchanged_count"],
+        "deleted_count": summary["deleted_count"],
+        "created_count": summary["created_count"],
+        "updated_count": summary["updated_count"],
+        "failed_count": summary["failed_count"],
+    }}
+
+
+async def run_export_job(job: dict, progress: dict) -> dict:
+    params = dict(job["params"])
+    export_format = params.pop("format")
+    query = build_query(**params)
+    employees_cursor = _CountingCursor(
+        list_read_collection.find(query, EXPORT_PROJECTION).batch_size(export_batch_size), progress
+    )
+    first_batch = await employees_cursor.to_list(length=export_batch_size)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    path = job_file_path(job["_id"], f".{export_format}")
+    try:
+        with open(path, "w+b") as output:
+            if export_format == "csv":
+                # Header-only when nothing matched, instead of the synchronous endpoint's 404.
+                if not first_batch:
+                    output.write(csv_chunk([], today, header=True))
+                async for chunk in stream_csv(employees_cursor, first_batch, today):
+                    output.write(chunk)
+            else:
+                await build_xlsx(employees_cursor, first_batch, today, output)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return {
+        "result": {"rows_exported": progress["rows_exported"]},
+        "artifact": {
+            "path": path,
+            "filename": f"employees.{export_format}",
+            "media_type": CSV_MEDIA_TYPE if export_format == "csv" else XLSX_MEDIA_TYPE,
+            "size": os.path.getsize(path),
+        },
+    }
+
+
+register_job_runner("import", run_import_job)
+register_job_runner("export", run_export_job)
+
+
+def _parse_job_id(job_id: str) -> ObjectId:
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail=f"Invalid job ID: {job_id}")
+    return ObjectId(job_id)
+
+
+@router.post("/jobs/import", response_model=dict, status_code=202)
+async def submit_import_job(
+    file: UploadFile = File(...),
+    sync: bool = Query(False, description="Delete employees that are not in the file")
+):
+    if not file.filename.endswith('.json'):
+        raise HTTPException(status_code=400, detail="Invalid file type. Please upload a JSON file.")
+
+    # The upload is kept on disk so the job can be resumed if its worker restarts.
+    job_id = ObjectId()
+    input_path = job_file_path(job_id, ".upload.json")
+    with open(input_path, "wb") as output:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, output, 1024 * 1024)
+
+    job = await submit_job("import", {"filename": file.filename, "sync": sync}, job_id=job_id, input_path=input_path)
+    return job_helper(job)
+
+
+@router.post("/jobs/export", response_model=dict, status_code=202)
+async def submit_export_job(
+    Project: Optional[str] = None,
+    project: Optional[str] = None,
+    Stream: Optional[str] = None,
+    allocationStatus: Optional[str] = None,
+    expiringStatus: Optional[str] = None,
+    Contract_Perm: Optional[str] = Query(None, alias="Contract / Perm"),
+    projectMatch: str = Query("contains", pattern="^(prefix|contains)$"),
+    search: Optional[str] = Query(None, description="Free-text search over name, project and skills"),
+    format: str = Query("xlsx", pattern="^(xlsx|csv)$")
+):
+    params = {
+        "Project": Project, "project": project, "Stream": Stream, "allocationStatus": allocationStatus,
+        "expiringStatus": expiringStatus, "Contract_Perm": Contract_Perm, "projectMatch": projectMatch,
+        "search": search, "format": format
+    }
+    job = await submit_job("export", params)
+    return job_helper(job)
+
+
+@router.get("/jobs", response_model=list)
+async def list_jobs(
+    kind: Optional[str] = Query(None, pattern="^(import|export)$"),
+    limit: int = Query(20, ge=1, le=100)
+):
+    query = {"kind": kind} if kind else {}
+    jobs = await jobs_collection.find(query).sort("created_at", -1).to_list(length=limit)
+    return [job_helper(job) for job in jobs]
+
+
+@router.get("/jobs/{job_id}", response_model=dict)
+async def get_job_status(job_id: str):
+    job = await get_job(_parse_job_id(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+    return job_helper(job)
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=dict)
+async def cancel_job_by_id(job_id: str):
+    job = await cancel_job(_parse_job_id(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+    return job_helper(job)
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_job_artifact(job_id: str):
+    job = await get_job(_parse_job_id(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+    if job["status"] != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, not completed")
+    artifact = job.get("artifact")
+    if not artifact or not os.path.exists(artifact["path"]):
+        raise HTTPException(status_code=404, detail="This job has no downloadable file")
+    return FileResponse(artifact["path"], media_type=artifact["media_type"], filename=artifact["filename"])
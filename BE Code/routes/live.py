@@ -0,0 +1,39 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from config.config import live_keepalive_seconds
+from services.live import live_feed
+
+router = APIRouter()
+
+
+@router.get("/live")
+async def live_updates():
+    """
+    Server-sent events: a `snapshot` with the dashboard summary on connect, then
+    `changes` events carrying row deltas and the updated summary. When `resync` is
+    true the client should refetch the rows it shows.
+    """
+    try:
+        queue = await live_feed.subscribe(timeout=live_keepalive_seconds)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Live updates are not available right now")
+
+    async def events():
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), live_keepalive_seconds)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection.
+                    yield ": keepalive\n\n"
+        finally:
+            live_feed.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,18 +1,60 @@
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from routes import manage
+from routes import jobs, live, manage, metrics, planner, trends
+from services.metrics import MetricsMiddleware, start_metrics_flush, stop_metrics_flush
+from services.responses import CompressionMiddleware, ETagMiddleware, MongoJSONResponse
+from db.db import connect, close
+from db.migrations import start_migrations, stop_migrations
+from services.offload import shutdown_cpu_pool
+from services.jobs import start_jobs, stop_jobs
+from services.live import live_feed
+from services.snapshots import start_snapshots, stop_snapshots
+from config.config import run_startup_tasks
 # ------------------- App Config -------------------
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connecting (and warming the pool) here means startup, not the first request, pays for it.
+    await connect()
+    try:
+        if run_startup_tasks:
+            start_migrations()
+        # Also resumes jobs left unfinished by a worker that stopped.
+        start_jobs()
+        start_snapshots()
+        start_metrics_flush()
+        yield
+    finally:
+        await stop_metrics_flush()
+        await stop_snapshots()
+        await live_feed.stop()
+        await stop_jobs()
+        await stop_migrations()
+        shutdown_cpu_pool()
+        close()
 
+
+app = FastAPI(lifespan=lifespan, default_response_class=MongoJSONResponse)
+
+# Innermost first: the ETag is computed on the uncompressed body, and CORS headers reach 304s too.
+app.add_middleware(ETagMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Dashboard-Source", "ETag"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
-app.include_router(manage.router, tags=["Manage"])
\ No newline at end of file
+app.include_router(manage.router, tags=["Manage"])
+app.include_router(jobs.router, tags=["Jobs"])
+app.include_router(live.router, tags=["Live"])
+app.include_router(trends.router, tags=["Trends"])
+app.include_router(planner.router, tags=["Planner"])
+app.include_router(metrics.router, tags=["Metrics"])
\ No newline at end of file
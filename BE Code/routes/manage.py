@@ -1,22 +1,75 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Query
-from fastapi.responses import StreamingResponse
-from typing import List, Optional, Any
-from db.db import list_collection  # Assuming your db connection is here
+from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.background import BackgroundTask
+from typing import List, Optional, Any, Union
+from db.db import list_collection, list_read_collection  # Assuming your db connection is here
 from models.models import Employee  # Assuming your Pydantic model is here
+from services.bulk_import import bulk_upsert, process_on_cpu_pool
+from services.json_stream import iter_json_array_items
+from services.export import EXPORT_PROJECTION, CSV_MEDIA_TYPE, XLSX_MEDIA_TYPE, build_xlsx, iter_file, stream_csv
+from services.offload import acquire_cpu_slot, cpu_job, release_when_done, run_cpu
+from services.normalize import (
+    INTERNAL_FIELDS_PROJECTION, normalize_skills, parse_fields, project_filter, select_fields,
+    storage_projection, to_api, to_storage
+)
+from services.skills import apply_skill_delta, get_skill_counts
+from services.dashboard_counters import apply_dashboard_delta
+from db.migrations import recount_dashboard_counters, recount_skills
+from services.dashboard import compute_dashboard_summary
+from services.snapshots import get_snapshot, snapshot_summary
+from services.cache import dashboard_cache, invalidate_caches, next_midnight
+from services.roster import mark_roster_changed
+from services.responses import MongoJSONResponse
+from services.pagination import (
+    InvalidCursor, KEYSET_SORT_FIELDS, decode_cursor, encode_cursor, filter_fingerprint,
+    keyset_filter, resolve_sort_field, sort_spec
+)
+from db.indexes import explain_find, explain_count
+from config.config import dashboard_snapshot_fallback_seconds, export_batch_size, query_explain_enabled
 from bson import ObjectId
 import pymongo
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import json
+import logging
 from datetime import datetime, timedelta # Import timedelta
-from io import BytesIO
-from openpyxl import Workbook
 import asyncio
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def check_explain_enabled():
+    if not query_explain_enabled:
+        raise HTTPException(status_code=403, detail="Query explain is disabled on this server")
+
+def add_countdown(employees: List[dict]):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for emp in employees:
+        end_date = emp.get("Resource End date")
+        if end_date and isinstance(end_date, datetime):
+            delta = end_date - today
+            emp["Countdown"] = delta.days 
+        else:
+            emp["Countdown"] = None
+
+def countdown_expression(today: datetime) -> dict:
+    # Same as add_countdown, but evaluated by Mongo; non-date end dates give None.
+    return {"$cond": {
+        "if": {"$eq": [{"$type": "$resource_end_date"}, "date"]},
+        "then": {"$dateDiff": {"startDate": today, "endDate": "$resource_end_date", "unit": "day"}},
+        "else": None
+    }}
 
 def employee_helper(employee: Any) -> dict:
-    if employee and "_id" in employee:
-        employee["_id"] = str(employee["_id"])
-    return employee
+    # Stored documents use the canonical field names; clients get the API's aliases.
+    # ObjectIds and dates are left for MongoJSONResponse to serialize.
+    return to_api(employee) if employee else employee
+
+def requested_fields(fields: Optional[str]) -> Optional[List[str]]:
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 def build_query(
     Project: Optional[str],
@@ -24,73 +77,166 @@ def build_query(
     Stream: Optional[str],
     allocationStatus: Optional[str],
     expiringStatus: Optional[str],
-    Contract_Perm: Optional[str]
+    Contract_Perm: Optional[str],
+    projectMatch: Optional[str] = "contains",
+    search: Optional[str] = None
 ) -> dict:
     query = {}
     
     project_filter_value = Project or project
     if project_filter_value:
-        query["Project"] = {"$regex": project_filter_value, "$options": "i"}
+        query.update(project_filter(project_filter_value, projectMatch))
+    if search:
+        query["$text"] = {"$search": search}
     if Stream:
-        query["Stream"] = Stream
+        query["stream"] = Stream
     if Contract_Perm:
-        query["Contract / Perm"] = Contract_Perm
+        query["contract_perm"] = Contract_Perm
     
     if allocationStatus == "partial":
-        query["% Allocation"] = {"$lt": 100}
+        query["allocation"] = {"$lt": 100}
     elif allocationStatus == "full":
-        query["% Allocation"] = 100
+        query["allocation"] = 100
 
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     # UPDATED: "at-risk" now includes contracts that have already expired.
     if expiringStatus == "at-risk":
-        query["Resource End date"] = {"$lte": today + timedelta(days=30)}
+        query["resource_end_date"] = {"$lte": today + timedelta(days=30)}
     elif expiringStatus == "0-30":
-        query["Resource End date"] = {"$gte": today, "$lte": today + timedelta(days=30)}
+        query["resource_end_date"] = {"$gte": today, "$lte": today + timedelta(days=30)}
     elif expiringStatus == "31-60":
-        query["Resource End date"] = {"$gte": today + timedelta(days=31), "$lte": today + timedelta(days=60)}
+        query["resource_end_date"] = {"$gte": today + timedelta(days=31), "$lte": today + timedelta(days=60)}
     elif expiringStatus == "61-90":
-        query["Resource End date"] = {"$gte": today + timedelta(days=61), "$lte": today + timedelta(days=90)}
+        query["resource_end_date"] = {"$gte": today + timedelta(days=61), "$lte": today + timedelta(days=90)}
         
     return query
 
 # --- Employee Data Endpoints ---
 
-@router.get("/employees", response_model=List[dict])
+@router.get("/employees", response_model=Union[List[dict], dict])
 async def get_employees(
     skip: int = Query(0, ge=0),
-    limit: int = Query(10, le=100),
+    limit: int = Query(10, ge=1, le=100),
     Project: Optional[str] = None,
     project: Optional[str] = None,
     Stream: Optional[str] = None,
     allocationStatus: Optional[str] = None,
     expiringStatus: Optional[str] = None,
     Contract_Perm: Optional[str] = Query(None, alias="Contract / Perm"),
+    projectMatch: str = Query("contains", pattern="^(prefix|contains)$"),
+    search: Optional[str] = Query(None, description="Free-text search over name, project and skills"),
     sortBy: Optional[str] = Query("First name", alias="sortBy"),
-    sortDirection: Optional[str] = Query("ascending", alias="sortDirection")
+    sortDirection: Optional[str] = Query("ascending", alias="sortDirection"),
+    cursor: Optional[str] = Query(None, description="Keyset pagination: pass an empty value for the first page, then nextCursor"),
+    includeTotal: bool = Query(False, description="Return {items, total} from a single aggregation"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. First name,Stream,Countdown"),
+    explain: bool = False
 ):
     try:
-        query = build_query(Project, project, Stream, allocationStatus, expiringStatus, Contract_Perm)
+        selected = requested_fields(fields)
+        query = build_query(Project, project, Stream, allocationStatus, expiringStatus, Contract_Perm, projectMatch, search)
         direction = pymongo.ASCENDING if sortDirection == "ascending" else pymongo.DESCENDING
-        
-        employees_cursor = list_collection.find(query).sort(sortBy, direction).skip(skip).limit(limit)
-        employees = await employees_cursor.to_list(length=limit)
-        
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        for emp in employees:
-            end_date = emp.get("Resource End date")
-            if end_date and isinstance(end_date, datetime):
-                delta = end_date - today
-                emp["Countdown"] = delta.days 
-            else:
-                emp["Countdown"] = None
-
-        return [employee_helper(emp) for emp in employees]
+        sort_field = resolve_sort_field(sortBy)
+        sort = sort_spec(sort_field, direction)
+
+        if cursor is not None:
+            return await get_employees_page(
+                query, sort_field, direction, cursor, limit,
+                filter_fingerprint(Project or project, Stream, allocationStatus, expiringStatus, Contract_Perm, projectMatch, search),
+                explain, selected
+            )
+
+        if explain:
+            check_explain_enabled()
+            return JSONResponse(await explain_find(query, sort, skip, limit))
+
+        if includeTotal:
+            return await get_employees_with_total(query, sort, skip, limit, selected)
+
+        employees_cursor = list_read_collection.find(query, storage_projection(selected)).sort(sort).skip(skip).limit(limit)
+        employees = [employee_helper(emp) for emp in await employees_cursor.to_list(length=limit)]
+        add_countdown(employees)
+
+        return MongoJSONResponse([select_fields(emp, selected) for emp in employees])
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Listing employees failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def get_employees_with_total(query: dict, sort: list, skip: int, limit: int, fields: Optional[List[str]] = None) -> MongoJSONResponse:
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    pipeline = [
+        {"$match": query},
+        # Sorting before $facet lets the sort use an index; stages inside $facet cannot.
+        {"$sort": dict(sort)},
+        {"$facet": {
+            "items": [
+                {"$skip": skip},
+                {"$limit": limit},
+                {"$project": storage_projection(fields)},
+                {"$addFields": {"Countdown": countdown_expression(today)}}
+            ],
+            "total": [{"$count": "count"}]
+        }}
+    ]
+    results = await list_read_collection.aggregate(pipeline, allowDiskUse=True).to_list(length=1)
+    page = results[0] if results else {"items": [], "total": []}
+    return MongoJSONResponse({
+        "items": [select_fields(to_api(emp), fields) for emp in page["items"]],
+        "total": page["total"][0]["count"] if page["total"] else 0
+    })
+
+
+async def get_employees_page(
+    query: dict, sort_field: str, direction: int, cursor: str, limit: int, fingerprint: str, explain: bool,
+    fields: Optional[List[str]] = None
+) -> Union[MongoJSONResponse, JSONResponse]:
+    if sort_field not in KEYSET_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Cursor pagination is not supported when sorting by '{sort_field}'")
+
+    total = None
+    page_query = query
+    if cursor:
+        try:
+            position = decode_cursor(cursor, sort_field, direction, fingerprint)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        total = position["t"]
+        page_query = {"$and": [query, keyset_filter(sort_field, direction, position["v"], position["id"])]}
+
+    sort = sort_spec(sort_field, direction)
+    if explain:
+        check_explain_enabled()
+        return JSONResponse(await explain_find(page_query, sort, 0, limit))
+
+    projection = storage_projection(fields)
+    if fields is not None:
+        # The next cursor is built from the last row's sort value.
+        projection[sort_field] = 1
+    # Fetch one extra row to know whether another page exists without a count.
+    employees_task = list_read_collection.find(page_query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    if total is None:
+        # The total is counted once on the first page and then carried inside the cursor.
+        employees, total = await asyncio.gather(employees_task, list_read_collection.count_documents(query))
+    else:
+        employees = await employees_task
+
+    next_cursor = None
+    if len(employees) > limit:
+        employees = employees[:limit]
+        next_cursor = encode_cursor(employees[-1], sort_field, direction, fingerprint, total)
+
+    items = [employee_helper(emp) for emp in employees]
+    add_countdown(items)
+    return MongoJSONResponse({
+        "items": [select_fields(emp, fields) for emp in items],
+        "nextCursor": next_cursor,
+        "total": total
+    })
+
+
 @router.get("/employees/count", response_model=dict)
 async def get_employees_count(
     Project: Optional[str] = None,
@@ -98,36 +244,44 @@ async def get_employees_count(
     Stream: Optional[str] = None,
     allocationStatus: Optional[str] = None,
     expiringStatus: Optional[str] = None,
-    Contract_Perm: Optional[str] = Query(None, alias="Contract / Perm")
+    Contract_Perm: Optional[str] = Query(None, alias="Contract / Perm"),
+    projectMatch: str = Query("contains", pattern="^(prefix|contains)$"),
+    search: Optional[str] = Query(None, description="Free-text search over name, project and skills"),
+    explain: bool = False
 ):
     try:
-        query = build_query(Project, project, Stream, allocationStatus, expiringStatus, Contract_Perm)
-        count = await list_collection.count_documents(query)
+        query = build_query(Project, project, Stream, allocationStatus, expiringStatus, Contract_Perm, projectMatch, search)
+        if explain:
+            check_explain_enabled()
+            return await explain_count(query)
+        count = await list_read_collection.count_documents(query)
         return {"total": count}
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Counting employees failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/employees", response_model=dict)
 async def create_employee(employee: Employee):
     try:
-        employee_data = employee.dict(by_alias=True)
-        # Countdown is dynamically calculated, so we can remove it from here.
-        numeric_fields = ["% Allocation"]
-
-        for key, value in employee_data.items():
-            if isinstance(value, str):
-                employee_data[key] = value.strip()
-            if key in numeric_fields and value == "":
-                employee_data[key] = 0
-        
-        # Remove Countdown from the payload if it exists
-        employee_data.pop("Countdown", None)
+        # Strips strings, fixes the types and drops the calculated Countdown.
+        employee_data = to_storage(employee.dict(by_alias=True))
 
         if not employee_data:
             raise HTTPException(status_code=400, detail="No employee data provided")
         result = await list_collection.insert_one(employee_data)
+        invalidate_caches()
+        await mark_roster_changed()
+        await apply_skill_delta(None, employee_data)
+        await apply_dashboard_delta(None, employee_data)
         return {"_id": str(result.inserted_id), "message": "Employee created successfully"}
+    except HTTPException:
+        raise
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="An employee with this first and last name already exists")
     except Exception as e:
+        logger.exception("Creating an employee failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -136,27 +290,34 @@ async def update_employee(employee_id: str, employee_data: Employee):
     if not ObjectId.is_valid(employee_id):
         raise HTTPException(status_code=400, detail="Invalid employee ID format")
     
-    update_data = employee_data.dict(by_alias=True, exclude_unset=True)
-    
-    # Remove Countdown from the payload if it exists, as it's a calculated field
-    update_data.pop("Countdown", None)
+    # Countdown is a calculated field, so to_storage leaves it out of the update.
+    update_data = to_storage(employee_data.dict(by_alias=True, exclude_unset=True), partial=True)
 
     if not update_data:
         raise HTTPException(status_code=400, detail="No update data provided")
 
-    result = await list_collection.update_one(
-        {"_id": ObjectId(employee_id)},
-        {"$set": update_data}
-    )
-    
-    if result.modified_count == 1:
-        return {"message": "Employee updated successfully"}
+    try:
+        # The previous version is needed to adjust the materialized skill counts.
+        existing_employee = await list_collection.find_one_and_update(
+            {"_id": ObjectId(employee_id)},
+            # The document no longer matches its last import, so the next import must rewrite it.
+            {"$set": update_data, "$unset": {"content_hash": ""}},
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="An employee with this first and last name already exists")
     
-    existing_employee = await list_collection.find_one({"_id": ObjectId(employee_id)})
-    if existing_employee:
+    if existing_employee is None:
+        raise HTTPException(status_code=404, detail=f"Employee with ID {employee_id} not found")
+
+    if all(existing_employee.get(key) == value for key, value in update_data.items()):
         return {"message": "Employee data is the same, no update was performed."}
 
-    raise HTTPException(status_code=404, detail=f"Employee with ID {employee_id} not found")
+    invalidate_caches()
+    await mark_roster_changed()
+    await apply_skill_delta(existing_employee, {**existing_employee, **update_data})
+    await apply_dashboard_delta(existing_employee, {**existing_employee, **update_data})
+    return {"message": "Employee updated successfully"}
 
 
 @router.delete("/employees/{employee_id}", response_model=dict)
@@ -164,73 +325,78 @@ async def delete_employee(employee_id: str):
     if not ObjectId.is_valid(employee_id):
         raise HTTPException(status_code=400, detail="Invalid employee ID format")
         
-    result = await list_collection.delete_one({"_id": ObjectId(employee_id)})
+    deleted_employee = await list_collection.find_one_and_delete({"_id": ObjectId(employee_id)})
 
-    if result.deleted_count == 1:
+    if deleted_employee is not None:
+        invalidate_caches()
+        await mark_roster_changed()
+        await apply_skill_delta(deleted_employee, None)
+        await apply_dashboard_delta(deleted_employee, None)
         return {"message": "Employee deleted successfully"}
 
     raise HTTPException(status_code=404, detail=f"Employee with ID {employee_id} not found")
 
 @router.post("/employees/bulk-import-file", response_model=dict)
-async def bulk_import_employees_from_file(file: UploadFile = File(...)):
-    try:
-        if not file.filename.endswith('.json'):
-            raise ValueError("Invalid file type. Please upload a JSON file.")
-        
-        contents = await file.read()
-        data = json.loads(contents)
-
-        if not isinstance(data, dict) or "resources" not in data:
-            raise ValueError("Invalid JSON format: must contain a 'resources' key.")
-        
-        employees_raw_data = data["resources"]
-        if not isinstance(employees_raw_data, list):
-            raise ValueError("'resources' key must contain a list.")
-        
-        created_count = 0
-        updated_count = 0
-        
-        for record in employees_raw_data:
-            if not record.get("First name") or not record.get("Last name"):
-                continue
-
-            processed_record = {
-                "First name": record.get("First name"), "Last name": record.get("Last name"),
-                "Line Manager": record.get("Line Manager"), "Project": record.get("Project"),
-                "Open Air ID": record.get("Open Air ID"), "Location": record.get("Location"),
-                "Stream": record.get("Stream"), "Tech Skills": record.get("Tech Skills"),
-                "Job Title": record.get("Job Title"), "Contract / Perm": record.get("Contract / Perm"),
-                "Billable": record.get("Billable"), "Notes": record.get("Notes")
-            }
-            processed_record["% Allocation"] = int(record.get("% Allocation") or 0)
-            
-            end_date_str = record.get("Resource End date")
-            if end_date_str and isinstance(end_date_str, str) and end_date_str.strip():
-                try:
-                    processed_record["Resource End date"] = datetime.strptime(end_date_str, "%d/%m/%Y")
-                except ValueError:
-                    processed_record["Resource End date"] = None
+async def bulk_import_employees_from_file(
+    file: UploadFile = File(...),
+    stream: bool = Query(False, description="Parse the upload incrementally instead of loading it whole"),
+    sync: bool = Query(False, description="Delete employees that are not in the file")
+):
+    # Acquired outside the try so the 429 isn't turned into a 500 below.
+    async with cpu_job():
+        try:
+            if not file.filename.endswith('.json'):
+                raise ValueError("Invalid file type. Please upload a JSON file.")
+
+            if stream:
+                record_count = 0
+
+                async def records_from_upload():
+                    nonlocal record_count
+                    async for record in iter_json_array_items(file, "resources"):
+                        record_count += 1
+                        yield record
+
+                raw_records = records_from_upload()
             else:
-                processed_record["Resource End date"] = None
-            
-            query = {"First name": processed_record["First name"], "Last name": processed_record["Last name"]}
-            update_data = {"$set": processed_record}
-            result = await list_collection.update_one(query, update_data, upsert=True)
-
-            if result.upserted_id:
-                created_count += 1
-            elif result.modified_count > 0:
-                updated_count += 1
-        
-        return {
-            "message": f"Successfully processed {len(employees_raw_data)} records.",
-            "created_count": created_count,
-            "updated_count": updated_count
-        }
-    except (ValueError, json.JSONDecodeError) as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+                contents = await file.read()
+                data = await run_cpu(json.loads, contents)
+
+                if not isinstance(data, dict) or "resources" not in data:
+                    raise ValueError("Invalid JSON format: must contain a 'resources' key.")
+
+                raw_records = data["resources"]
+                if not isinstance(raw_records, list):
+                    raise ValueError("'resources' key must contain a list.")
+
+                record_count = len(raw_records)
+
+            processed_records = process_on_cpu_pool(raw_records)
+
+            changed = True
+            try:
+                summary = await bulk_upsert(processed_records, sync=sync)
+                changed = any(summary[field] for field in ("created_count", "updated_count", "deleted_count"))
+            finally:
+                # Even a failed import may have written some batches; one that changed nothing
+                # leaves the caches alone. The skill counts were adjusted batch by batch.
+                if changed:
+                    invalidate_caches()
+
+            return {
+                "message": f"Successfully processed {record_count} records.",
+                "unchanged_count": summary["unchanged_count"],
+                "deleted_count": summary["deleted_count"],
+                "created_count": summary["created_count"],
+                "updated_count": summary["updated_count"],
+                "failed_count": summary["failed_count"],
+                "batches": summary["batches"]
+            }
+        except (ValueError, json.JSONDecodeError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.exception("Bulk import failed")
+            raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 
 # @router.get("/employees/export-excel")
@@ -299,179 +465,148 @@ async def export_employees_to_excel(
     Stream: Optional[str] = None,
     allocationStatus: Optional[str] = None,
     expiringStatus: Optional[str] = None,
-    Contract_Perm: Optional[str] = Query(None, alias="Contract / Perm")
+    Contract_Perm: Optional[str] = Query(None, alias="Contract / Perm"),
+    projectMatch: str = Query("contains", pattern="^(prefix|contains)$"),
+    search: Optional[str] = Query(None, description="Free-text search over name, project and skills"),
+    format: str = Query("xlsx", pattern="^(xlsx|csv)$")
 ):
+    # Raises 429 once too many exports/imports are already running on this worker.
+    slot = await acquire_cpu_slot()
+    slot_handed_off = False
     try:
-        query = build_query(Project, project, Stream, allocationStatus, expiringStatus, Contract_Perm)
-        employees_cursor = list_collection.find(query)
-        employees = await employees_cursor.to_list(length=None)
+        query = build_query(Project, project, Stream, allocationStatus, expiringStatus, Contract_Perm, projectMatch, search)
+        employees_cursor = list_read_collection.find(query, EXPORT_PROJECTION).batch_size(export_batch_size)
+        first_batch = await employees_cursor.to_list(length=export_batch_size)
 
-        if not employees:
+        if not first_batch:
             raise HTTPException(status_code=404, detail="No employees found to export")
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Employees"
-        
-        headers = list(employees[0].keys()) if employees else []
-        if "Countdown" not in headers:
-            headers.append("Countdown")
-        ws.append(headers)
-        
         today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
-        for emp in employees:
-            end_date = emp.get("Resource End date")
-            if end_date and isinstance(end_date, datetime):
-                delta = end_date - today
-                emp["Countdown"] = delta.days
-            else:
-                emp["Countdown"] = None
-
-            row_data = []
-            for col in headers:
-                value = emp.get(col)
-                # --- FIX: Convert ObjectId to string ---
-                if isinstance(value, ObjectId):
-                    row_data.append(str(value))
-                elif isinstance(value, list):
-                    row_data.append(", ".join(map(str, value)))
-                elif isinstance(value, datetime):
-                    row_data.append(value.strftime("%d/%m/%Y"))
-                else:
-                    row_data.append(value)
-            ws.append(row_data)
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
+        if format == "csv":
+            # The CSV is generated while it streams, so the slot is released with the body.
+            body = release_when_done(stream_csv(employees_cursor, first_batch, today), slot)
+            slot_handed_off = True
+            return StreamingResponse(
+                body,
+                media_type=CSV_MEDIA_TYPE,
+                headers={"Content-Disposition": "attachment; filename=employees.csv"},
+                background=BackgroundTask(slot.release)
+            )
+
+        # The xlsx zip container can only be written once every row is in, so the whole
+        # workbook is built before the response starts and the file is streamed afterwards.
+        output = await build_xlsx(employees_cursor, first_batch, today)
         return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            iter_file(output),
+            media_type=XLSX_MEDIA_TYPE,
             headers={"Content-Disposition": "attachment; filename=employees.xlsx"}
         )
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Export failed")
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+    finally:
+        if not slot_handed_off:
+            slot.release()
 
 
-# --- UPDATED DASHBOARD SUMMARY ---
 @router.get("/dashboard-summary")
 async def get_dashboard_summary():
     try:
         today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        thirty_days_from_now = today + timedelta(days=30)
-        ninety_days_from_now = today + timedelta(days=90)
-
-        # UPDATED: Query now includes expired contracts
-        at_risk_query = {"Resource End date": {"$lte": thirty_days_from_now}}
-        
-        expiring_contracts_pipeline = [
-            # UPDATED: Match includes expired contracts up to 90 days from now
-            {"$match": {"Resource End date": {"$lte": ninety_days_from_now}}},
-            {"$addFields": {
-                "days_diff": {"$dateDiff": {"startDate": today, "endDate": "$Resource End date", "unit": "day"}}
-            }},
-            # UPDATED: Boundaries now correctly bucket negative (expired) days
-            {"$bucket": {
-                "groupBy": "$days_diff",
-                "boundaries": [-99999, 31, 61, 91],
-                "default": "Other",
-                "output": {"count": {"$sum": 1}}
-            }},
-            {"$project": {
-                "name": {"$switch": {"branches": [
-                    # UPDATED: Label is clearer for the first bucket
-                    {"case": {"$eq": ["$_id", -99999]}, "then": "Expired / 0-30 Days"},
-                    {"case": {"$eq": ["$_id", 31]}, "then": "31-60 Days"},
-                    {"case": {"$eq": ["$_id", 61]}, "then": "61-90 Days"}
-                ], "default": "Other"}},
-                "value": "$count", "_id": 0
-            }}
-        ]
-
-        at_risk_employees_pipeline = [
-            {"$match": at_risk_query},
-            {"$addFields": {
-                "daysLeft": {"$dateDiff": {"startDate": today, "endDate": "$Resource End date", "unit": "day"}}
-            }},
-            {"$sort": {"daysLeft": 1}},
-            {"$limit": 5},
-            {"$project": {
-                "id": {"$toString": "$_id"},
-                "name": {"$concat": ["$First name", " ", "$Last name"]},
-                "daysLeft": "$daysLeft",
-                "project": "$Project", "_id": 0
-            }}
-        ]
-
-        results = await asyncio.gather(
-            list_collection.count_documents({}),
-            list_collection.count_documents(at_risk_query),
-            list_collection.count_documents({"% Allocation": {"$lt": 100}}),
-            list_collection.distinct("Project"),
-            list_collection.aggregate([{"$group": {"_id": "$Stream", "value": {"$sum": 1}}}, {"$project": {"name": "$_id", "value": 1, "_id": 0}}]).to_list(length=None),
-            list_collection.aggregate([{"$group": {"_id": "$Project", "value": {"$sum": 1}}}, {"$project": {"name": "$_id", "value": 1, "_id": 0}}, {"$sort": {"value": -1}}]).to_list(length=None),
-            list_collection.aggregate(expiring_contracts_pipeline).to_list(length=None),
-            list_collection.aggregate(at_risk_employees_pipeline).to_list(length=None),
-            list_collection.aggregate([{"$group": {"_id": {"project": "$Project", "stream": "$Stream"}, "count": {"$sum": 1}}}, {"$group": {"_id": "$_id.project", "streams": {"$push": {"k": "$_id.stream", "v": "$count"}}}}, {"$addFields": {"streams_obj": {"$arrayToObject": "$streams"}}}, {"$project": {"_id": 0, "project": "$_id", "Backend": {"$ifNull": ["$streams_obj.Backend", 0]}, "Frontend": {"$ifNull": ["$streams_obj.Frontend", 0]}, "QA": {"$ifNull": ["$streams_obj.QA", 0]}}}, {"$sort": {"project": 1}}]).to_list(length=None)
-        )
-
-        (total_headcount, at_risk_contracts, partially_allocated, active_projects, 
-         headcount_by_stream, headcount_per_project, expiring_contracts_breakdown, 
-         at_risk_employees, project_stream_distribution) = results
-
-        # Filter out "Other" bucket if it exists
-        expiring_contracts_breakdown = [b for b in expiring_contracts_breakdown if b.get("name") != "Other"]
-
-        return {
-            "kpis": {
-                "totalHeadcount": total_headcount,
-                "atRiskContracts": at_risk_contracts,
-                "partiallyAllocated": partially_allocated,
-                "activeProjects": len(active_projects)
-            },
-            "charts": {
-                "headcountByStream": headcount_by_stream,
-                "headcountPerProject": headcount_per_project,
-                "expiringContractsBreakdown": expiring_contracts_breakdown,
-                "projectStreamDistribution": project_stream_distribution
-            },
-            "atRiskEmployees": at_risk_employees
-        }
+        # Keyed by day and expiring at midnight so the date-relative buckets roll over.
+        def summary():
+            return dashboard_cache.get_or_compute(
+                ("dashboard-summary", today.date()),
+                lambda: compute_dashboard_summary(today),
+                expires_at=next_midnight(today)
+            )
+
+        if dashboard_snapshot_fallback_seconds <= 0:
+            return MongoJSONResponse(await summary())
+        try:
+            return MongoJSONResponse(await asyncio.wait_for(summary(), dashboard_snapshot_fallback_seconds))
+        except asyncio.TimeoutError:
+            # Under load, answer from today's snapshot; the computation carries on and fills the cache.
+            snapshot = await get_snapshot(today)
+            if snapshot is None:
+                return MongoJSONResponse(await summary())
+            return MongoJSONResponse(snapshot_summary(snapshot), headers={
+                "X-Dashboard-Source": f"snapshot; taken-at={snapshot['taken_at'].isoformat(timespec='seconds')}"
+            })
     except Exception as e:
+        logger.exception("Computing the dashboard summary failed")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @router.get("/skill-distribution")
 async def get_skill_distribution():
     try:
-        pipeline = [
-            {"$match": {"Stream": {"$in": ["Frontend", "Backend", "QA"]}}},
-            {"$addFields": {
-                "skills_array": {
-                    "$cond": {
-                        "if": {"$isArray": "$Tech Skills"}, "then": "$Tech Skills",
-                        "else": {"$cond": { "if": {"$ne": ["$Tech Skills", None]}, "then": ["$Tech Skills"], "else": [] }}
-                    }
-                }
-            }},
-            {"$unwind": "$skills_array"},
-            {"$addFields": {
-                "cleaned_skill": {"$trim": {"input": "$skills_array"}}
-            }},
-            {"$group": {
-                "_id": {"stream": "$Stream", "skill": "$cleaned_skill"},
-                "count": {"$sum": 1}
-            }},
-            {"$group": {
-                "_id": "$_id.stream",
-                "skills": {"$push": {"name": "$_id.skill", "count": "$count"}}
-            }},
-            {"$project": {
-                "_id": 0, "stream": "$_id", "skills": 1
-            }}
-        ]
-        skill_data = await list_collection.aggregate(pipeline).to_list(length=None)
-        return skill_data
+        return MongoJSONResponse(await get_skill_counts())
+    except Exception as e:
+        logger.exception("Loading the skill distribution failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/skill-distribution/recount", response_model=dict)
+async def recount_skill_distribution():
+    # Repairs counts that drifted when a delta failed. Deltas landing while it runs are lost,
+    # so run it while the roster is quiet.
+    try:
+        await recount_skills(True)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        logger.exception("Recounting the skill distribution failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"message": "Skill counts rebuilt"}
+
+
+@router.post("/dashboard-counters/recount", response_model=dict)
+async def recount_live_dashboard_counters():
+    # Repairs the counters behind the /live summary; the same caveat as the skill recount applies.
+    try:
+        await recount_dashboard_counters(True)
+    except Exception as e:
+        logger.exception("Recounting the dashboard counters failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"message": "Dashboard counters rebuilt"}
+
+
+@router.get("/employees/by-skill", response_model=List[dict])
+async def get_employees_by_skill(
+    skill: str,
+    Stream: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return")
+):
+    try:
+        selected = requested_fields(fields)
+        _, keys = normalize_skills(skill)
+        if not keys:
+            raise HTTPException(status_code=400, detail="A skill name is required")
+        query = {"skill_keys": keys[0]}
+        if Stream:
+            query["stream"] = Stream
+        employees_cursor = list_read_collection.find(query, storage_projection(selected)).sort(sort_spec("first_name", pymongo.ASCENDING)).skip(skip).limit(limit)
+        employees = [employee_helper(emp) for emp in await employees_cursor.to_list(length=limit)]
+        add_countdown(employees)
+        return MongoJSONResponse([select_fields(emp, selected) for emp in employees])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Listing employees by skill failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/employees/{employee_id}", response_model=dict)
+async def get_employee(employee_id: str):
+    # Lists may return only the displayed columns; the edit form loads the full record.
+    if not ObjectId.is_valid(employee_id):
+        raise HTTPException(status_code=400, detail="Invalid employee ID format")
+    employee = await list_read_collection.find_one({"_id": ObjectId(employee_id)}, INTERNAL_FIELDS_PROJECTION)
+    if employee is None:
+        raise HTTPException(status_code=404, detail=f"Employee with ID {employee_id} not found")
+    employee = employee_helper(employee)
+    add_countdown([employee])
+    return MongoJSONResponse(employee)
@@ -0,0 +1,35 @@
+import logging
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Query
+
+from services.cache import next_midnight, planner_cache
+from services.offload import run_cpu
+from services.planner import load_roster, plan_capacity, weeks_for_months
+from services.responses import MongoJSONResponse
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/planner")
+async def get_capacity_plan(months: int = Query(6, ge=1, le=24, description="How far ahead to project")):
+    """
+    Week-by-week allocated and available FTE per stream and project, the bench
+    forecast and the billable ratio, assuming allocations end on each resource's
+    end date and nothing new is assigned.
+    """
+    try:
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        weeks = weeks_for_months(months)
+
+        async def compute():
+            documents = await load_roster()
+            return await run_cpu(plan_capacity, documents, today, weeks)
+
+        # Projections are relative to today, so they also expire at midnight.
+        plan = await planner_cache.get_or_compute(("planner", today.date(), weeks), compute, expires_at=next_midnight(today))
+        return MongoJSONResponse(plan)
+    except Exception as e:
+        logger.exception("Capacity planning failed")
+        raise HTTPException(status_code=500, detail=str(e))
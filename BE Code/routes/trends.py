@@ -0,0 +1,31 @@
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from config.config import trends_max_days
+from services.responses import MongoJSONResponse
+from services.snapshots import get_trends
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/trends", response_model=list)
+async def get_trend_snapshots(
+    start: Optional[date] = Query(None, description="First day (YYYY-MM-DD); defaults to 30 days before end"),
+    end: Optional[date] = Query(None, description="Last day (YYYY-MM-DD); defaults to today")
+):
+    """One point per day with a snapshot: KPIs, headcount by stream and project, allocation bands and expiry buckets."""
+    end = end or date.today()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days + 1 > trends_max_days:
+        raise HTTPException(status_code=400, detail=f"The range can span at most {trends_max_days} days")
+    try:
+        return MongoJSONResponse(await get_trends(datetime.combine(start, time()), datetime.combine(end, time())))
+    except Exception as e:
+        logger.exception("Loading trends failed")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,71 @@
+"""
+Production entry point: `python serve.py`. run.py stays the single-process dev server.
+
+Workers are separate processes that each import routes.main:app, so every worker opens
+its own Mongo client in the app lifespan; nothing connected is inherited from the parent.
+
+With more than one worker, the workers share one startup id, so exactly one of them claims
+the index builds and migrations (in the background, while all of them serve), and they
+pool their metrics in a shared directory so /metrics on any of them covers all.
+
+Signals to the parent process:
+    SIGHUP   restart the workers one at a time (graceful reload after a deploy)
+    SIGTTIN  add a worker
+    SIGTTOU  remove a worker
+    SIGTERM  drain in-flight requests (server_graceful_shutdown) and exit
+"""
+import glob
+import importlib.util
+import os
+import tempfile
+import uuid
+
+import uvicorn
+
+from config.config import (
+    metrics_multiprocess_dir, server_host, server_port, server_workers, server_loop,
+    server_http, server_backlog, server_keep_alive, server_graceful_shutdown, server_limit_max_requests,
+    server_limit_concurrency
+)
+
+
+def _resolve(option: str, preferred: str, fallback: str) -> str:
+    # Asking for uvloop/httptools explicitly when it isn't installed degrades instead of failing.
+    if option == preferred and importlib.util.find_spec(preferred) is None:
+        return fallback
+    return option
+
+
+def _prepare_workers():
+    # Workers read these from the environment they inherit.
+    os.environ["startup_run_id"] = uuid.uuid4().hex
+    metrics_dir = metrics_multiprocess_dir or tempfile.mkdtemp(prefix="uk-resource-metrics-")
+    os.makedirs(metrics_dir, exist_ok=True)
+    # Counters start from zero with the server, as they would in a single process.
+    for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        os.remove(path)
+    os.environ["metrics_multiprocess_dir"] = metrics_dir
+
+
+def main():
+    if server_workers > 1:
+        _prepare_workers()
+    uvicorn.run(
+        "routes.main:app",
+        host=server_host,
+        port=server_port,
+        workers=server_workers,
+        loop=_resolve(server_loop, "uvloop", "asyncio"),
+        http=_resolve(server_http, "httptools", "h11"),
+        backlog=server_backlog,
+        timeout_keep_alive=server_keep_alive,
+        timeout_graceful_shutdown=server_graceful_shutdown or None,
+        limit_max_requests=server_limit_max_requests or None,
+        limit_concurrency=server_limit_concurrency or None,
+        proxy_headers=True,
+        server_header=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
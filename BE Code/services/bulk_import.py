@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config.config import bulk_import_batch_size, bulk_import_concurrency
+from db.db import list_collection
+from models.models import SCHEMA_VERSION, STORAGE_FIELDS
+from services.roster import mark_roster_changed
+from services.normalize import to_storage
+from services.offload import run_cpu
+from services.dashboard_counters import apply_dashboard_deltas
+from services.skills import apply_skill_deltas
+
+
+def process_import_record(record: dict) -> Optional[dict]:
+    # Records without a name can't be matched to an existing employee, so they are skipped.
+    if not record.get("First name") or not record.get("Last name"):
+        return None
+
+    employee = {alias: record.get(alias) for alias in STORAGE_FIELDS}
+    employee["% Allocation"] = record.get("% Allocation") or 0
+    processed_record = to_storage(employee)
+    processed_record["content_hash"] = content_hash(processed_record)
+    return processed_record
+
+
+def content_hash(processed_record: dict) -> str:
+    # Fingerprint of everything an import writes, so re-importing an unchanged row can be skipped.
+    payload = json.dumps(processed_record, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def process_import_records(records: List[dict]) -> List[dict]:
+    return [processed for processed in map(process_import_record, records) if processed is not None]
+
+
+async def process_on_cpu_pool(
+    records: Union[Iterable[dict], AsyncIterable[dict]],
+    chunk_size: int = bulk_import_batch_size
+) -> AsyncIterator[dict]:
+    # strptime and the per-row normalization are pure Python; doing them a chunk at a
+    # time on the CPU pool keeps the event loop free for other requests.
+    chunk = []
+    async for record in _iterate(records):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            for processed in await run_cpu(process_import_records, chunk):
+                yield processed
+            chunk = []
+    if chunk:
+        for processed in await run_cpu(process_import_records, chunk):
+            yield processed
+
+
+def upsert_key(processed_record: dict) -> dict:
+    return {"first_name": processed_record["first_name"], "last_name": processed_record["last_name"]}
+
+
+# Clears the schema version 1 field names from a document the import rewrites.
+_LEGACY_FIELDS_UNSET = {alias: "" for alias in STORAGE_FIELDS}
+# Names, hash and the fields behind the skill and dashboard counts, in either schema
+_EXISTING_PROJECTION = {
+    "first_name": 1, "last_name": 1, "First name": 1, "Last name": 1, "content_hash": 1, "schema_version": 1,
+    "stream": 1, "tech_skills": 1, "Stream": 1, "Tech Skills": 1,
+    "allocation": 1, "project": 1, "% Allocation": 1, "Project": 1,
+}
+
+Name = Tuple[Any, Any]
+
+
+def _stored_name(doc: dict) -> Name:
+    if doc.get("schema_version") == SCHEMA_VERSION:
+        return doc.get("first_name"), doc.get("last_name")
+    return doc.get("First name"), doc.get("Last name")
+
+
+async def _load_existing(names: Set[Name]) -> Dict[Name, List[dict]]:
+    """
+    The stored documents for one batch's names, from the name index (plus the
+    schema_version index for documents the migration hasn't reached yet).
+    """
+    first_names = list({first for first, _ in names})
+    last_names = list({last for _, last in names})
+    query = {"$or": [
+        {"first_name": {"$in": first_names}, "last_name": {"$in": last_names}},
+        {"schema_version": {"$ne": SCHEMA_VERSION}, "First name": {"$in": first_names}, "Last name": {"$in": last_names}},
+    ]}
+    existing: Dict[Name, List[dict]] = {}
+    async for doc in list_collection.find(query, _EXISTING_PROJECTION):
+        name = _stored_name(doc)
+        # The two $in lists also match crossed pairs (one row's first name, another's last name).
+        if name in names:
+            existing.setdefault(name, []).append(doc)
+    return existing
+
+
+async def _delete_absent(seen: Set[Name], batch_size: int) -> int:
+    # Streams every name once and deletes in batches, so only the file's names are held in memory.
+    deleted = 0
+    stale = []
+
+    async def delete(docs: List[dict]) -> int:
+        result = await list_collection.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        await apply_skill_deltas((doc, None) for doc in docs)
+        await apply_dashboard_deltas((doc, None) for doc in docs)
+        return result.deleted_count
+
+    async for doc in list_collection.find({}, _EXISTING_PROJECTION):
+        if _stored_name(doc) not in seen:
+            stale.append(doc)
+        if len(stale) >= batch_size:
+            deleted += await delete(stale)
+            stale = []
+    if stale:
+        deleted += await delete(stale)
+    if deleted:
+        await mark_roster_changed()
+    return deleted
+
+
+async def _iterate(records: Union[Iterable[dict], AsyncIterable[dict]]) -> AsyncIterator[dict]:
+    if hasattr(records, "__aiter__"):
+        async for record in records:
+            yield record
+    else:
+        for record in records:
+            yield record
+
+
+def _batch_operations(
+    records: List[dict],
+    existing: Dict[Name, List[dict]],
+    skip_unchanged: bool
+) -> Tuple[List[UpdateOne], List[Tuple[Optional[dict], dict]], int]:
+    """The writes for one batch, each with the (stored, new) document pair it changes, and the unchanged count."""
+    operations = []
+    changes = []
+    unchanged = 0
+    for processed_record in records:
+        key = upsert_key(processed_record)
+        name = (key["first_name"], key["last_name"])
+        stored = existing.get(name, [])
+        record_hash = processed_record.get("content_hash")
+        # With duplicate names there's no telling which one an upsert would hit, so never skip those.
+        if skip_unchanged and record_hash is not None and len(stored) == 1 and stored[0].get("content_hash") == record_hash:
+            unchanged += 1
+            continue
+        if len(stored) == 1 and stored[0].get("schema_version") != SCHEMA_VERSION:
+            # Not migrated yet, so the name index can't find it; rewrite it in place by _id.
+            operation = UpdateOne({"_id": stored[0]["_id"]}, {"$set": processed_record, "$unset": _LEGACY_FIELDS_UNSET})
+        else:
+            operation = UpdateOne(key, {"$set": processed_record}, upsert=True)
+        operations.append(operation)
+        # $set keeps the stored fields the record doesn't carry, except legacy ones it unsets.
+        written = processed_record
+        if stored:
+            written = {**{field: value for field, value in stored[0].items() if field not in _LEGACY_FIELDS_UNSET}, **processed_record}
+        changes.append((stored[0] if stored else None, written))
+        if len(stored) <= 1:
+            # A later row for the same employee in this batch is compared against what this one writes.
+            existing[name] = [written]
+    return operations, changes, unchanged
+
+
+async def _write_batch(batch_number: int, records: List[dict], skip_unchanged: bool = True) -> dict:
+    names = {(record["first_name"], record["last_name"]) for record in records}
+    operations, changes, unchanged = _batch_operations(records, await _load_existing(names), skip_unchanged)
+    created = updated = failed = 0
+    failed_indexes = set()
+    if operations:
+        try:
+            result = await list_collection.bulk_write(operations, ordered=False)
+            created, updated = result.upserted_count, result.modified_count
+        except BulkWriteError as e:
+            # With ordered=False the rest of the batch is still applied; the details say how much.
+            details = e.details
+            created = details.get("nUpserted", 0)
+            updated = details.get("nModified", 0)
+            failed = len(details.get("writeErrors", []))
+            failed_indexes = {error["index"] for error in details.get("writeErrors", [])}
+    if created or updated:
+        # The counts follow the rows that were actually written, a batch at a time.
+        written = [change for index, change in enumerate(changes) if index not in failed_indexes]
+        await apply_skill_deltas(written)
+        await apply_dashboard_deltas(written)
+        await mark_roster_changed()
+
+    return {
+        "batch": batch_number,
+        "size": len(operations),
+        "unchanged_count": unchanged,
+        "created_count": created,
+        "updated_count": updated,
+        "failed_count": failed
+    }
+
+
+async def _lane_worker(
+    queue: asyncio.Queue,
+    batch_results: List[dict],
+    on_batch: Optional[Callable[[dict], None]],
+    skip_unchanged: bool
+):
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        result = await _write_batch(*item, skip_unchanged=skip_unchanged)
+        batch_results.append(result)
+        if on_batch is not None:
+            on_batch(result)
+
+
+async def bulk_upsert(
+    processed_records: Union[Iterable[dict], AsyncIterable[dict]],
+    batch_size: int = bulk_import_batch_size,
+    concurrency: int = bulk_import_concurrency,
+    on_batch: Optional[Callable[[dict], None]] = None,
+    skip_unchanged: bool = True,
+    sync: bool = False
+) -> dict:
+    """
+    Upserts processed records with chunked, unordered bulk_write calls.
+
+    Records are spread over `concurrency` lanes by their upsert key, and each lane
+    writes its batches one after another. Every occurrence of an employee therefore
+    lands in the same lane in file order, which keeps the created/updated counts the
+    same as upserting the rows one by one. `on_batch` is called with each batch
+    result as it is written, for progress reporting.
+
+    Each batch looks up its own employees' stored content hashes just before it is
+    written; with `skip_unchanged`, records whose hash matches never reach Mongo.
+    With `sync`, employees that don't appear in the records are deleted once every
+    upsert has gone through; a failed import deletes nothing.
+    """
+    batch_size = max(1, batch_size)
+    concurrency = max(1, concurrency)
+    # maxsize=1 keeps at most one pending batch per lane, so memory stays bounded by the batch size.
+    queues = [asyncio.Queue(maxsize=1) for _ in range(concurrency)]
+    buffers: List[List[dict]] = [[] for _ in range(concurrency)]
+    batch_results: List[dict] = []
+    # Only a sync import needs every name it has seen, to tell which employees are gone.
+    seen: Set[Name] = set()
+
+    async def produce():
+        batch_number = 0
+        async for processed_record in _iterate(processed_records):
+            name = (processed_record["first_name"], processed_record["last_name"])
+            if sync:
+                seen.add(name)
+            lane = hash(name) % concurrency
+            buffers[lane].append(processed_record)
+            if len(buffers[lane]) >= batch_size:
+                batch_number += 1
+                await queues[lane].put((batch_number, buffers[lane]))
+                buffers[lane] = []
+
+        for lane, records in enumerate(buffers):
+            if records:
+                batch_number += 1
+                await queues[lane].put((batch_number, records))
+            await queues[lane].put(None)
+
+    tasks = [asyncio.create_task(produce())]
+    tasks += [asyncio.create_task(_lane_worker(queue, batch_results, on_batch, skip_unchanged)) for queue in queues]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    deleted_count = 0
+    if sync:
+        if not seen:
+            raise ValueError("A sync import with no valid records would delete every employee.")
+        deleted_count = await _delete_absent(seen, batch_size)
+
+    batch_results.sort(key=lambda b: b["batch"])
+    return {
+        "unchanged_count": sum(b["unchanged_count"] for b in batch_results),
+        "deleted_count": deleted_count,
+        "created_count": sum(b["created_count"] for b in batch_results),
+        "updated_count": sum(b["updated_count"] for b in batch_results),
+        "failed_count": sum(b["failed_count"] for b in batch_results),
+        "batches": batch_results
+    }
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.config import dashboard_cache_ttl, planner_cache_ttl
+from services.roster import roster_version
+
+
+class AsyncTTLCache:
+    """
+    Small in-process cache for read-heavy endpoints.
+
+    Concurrent misses for the same key share a single computation, entries expire
+    after `ttl_seconds` (or at an explicit `expires_at`, whichever comes first), and
+    `invalidate()` drops everything, including results still being computed.
+
+    With a `version` callable, each entry is stamped with the version read before it was
+    computed and a read with a different current version is a miss. Writes in other
+    workers never reach this process's `invalidate()`, but they do bump the version.
+    """
+
+    def __init__(self, ttl_seconds: float, version: Optional[Callable[[], Awaitable[Any]]] = None):
+        self.ttl_seconds = ttl_seconds
+        self._version = version
+        self._entries: Dict[Any, Tuple[datetime, Any, Any]] = {}
+        self._inflight: Dict[Any, Tuple[Any, asyncio.Future]] = {}
+        self._generation = 0
+
+    async def get_or_compute(
+        self,
+        key: Any,
+        compute: Callable[[], Awaitable[Any]],
+        expires_at: Optional[datetime] = None
+    ) -> Any:
+        version = await self._version() if self._version else None
+        now = datetime.now()
+        entry = self._entries.get(key)
+        if entry and entry[0] > now and entry[1] == version:
+            return entry[2]
+
+        inflight = self._inflight.get(key)
+        # A computation started before the last write elsewhere would be stale; start a new one.
+        if inflight is None or inflight[0] != version:
+            inflight = (version, asyncio.ensure_future(self._compute(key, compute, expires_at, version)))
+            self._inflight[key] = inflight
+        # shield() keeps one cancelled caller from cancelling the shared computation.
+        return await asyncio.shield(inflight[1])
+
+    async def _compute(
+        self,
+        key: Any,
+        compute: Callable[[], Awaitable[Any]],
+        expires_at: Optional[datetime],
+        version: Any
+    ) -> Any:
+        generation = self._generation
+        try:
+            value = await compute()
+        finally:
+            inflight = self._inflight.get(key)
+            current = inflight is not None and inflight[1] is asyncio.current_task()
+            if current:
+                del self._inflight[key]
+
+        # A write that landed while we were computing makes this result stale, and a
+        # computation for a newer version replaced ours; don't keep it in either case.
+        if current and generation == self._generation and self.ttl_seconds > 0:
+            expiry = datetime.now() + timedelta(seconds=self.ttl_seconds)
+            if expires_at is not None:
+                expiry = min(expiry, expires_at)
+            self._entries[key] = (expiry, version, value)
+        return value
+
+    def invalidate(self):
+        self._generation += 1
+        self._entries.clear()
+        self._inflight.clear()
+
+
+def next_midnight(now: Optional[datetime] = None) -> datetime:
+    now = now or datetime.now()
+    return now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+
+dashboard_cache = AsyncTTLCache(dashboard_cache_ttl, version=roster_version)
+planner_cache = AsyncTTLCache(planner_cache_ttl, version=roster_version)
+
+_write_invalidated_caches: List[AsyncTTLCache] = [dashboard_cache, planner_cache]
+
+
+def invalidate_caches():
+    # Called by every endpoint that writes to list_collection. Only reaches this process;
+    # other workers notice the write through the roster version.
+    for cache in _write_invalidated_caches:
+        cache.invalidate()
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from db.db import list_read_collection
+from services.metrics import timed
+
+
+async def compute_dashboard_summary(today: datetime) -> dict:
+    thirty_days_from_now = today + timedelta(days=30)
+    ninety_days_from_now = today + timedelta(days=90)
+
+    # UPDATED: Query now includes expired contracts
+    at_risk_query = {"resource_end_date": {"$lte": thirty_days_from_now}}
+    
+    expiring_contracts_pipeline = [
+        # UPDATED: Match includes expired contracts up to 90 days from now
+        {"$match": {"resource_end_date": {"$lte": ninety_days_from_now}}},
+        {"$addFields": {
+            "days_diff": {"$dateDiff": {"startDate": today, "endDate": "$resource_end_date", "unit": "day"}}
+        }},
+        # UPDATED: Boundaries now correctly bucket negative (expired) days
+        {"$bucket": {
+            "groupBy": "$days_diff",
+            "boundaries": [-99999, 31, 61, 91],
+            "default": "Other",
+            "output": {"count": {"$sum": 1}}
+        }},
+        {"$project": {
+            "name": {"$switch": {"branches": [
+                # UPDATED: Label is clearer for the first bucket
+                {"case": {"$eq": ["$_id", -99999]}, "then": "Expired / 0-30 Days"},
+                {"case": {"$eq": ["$_id", 31]}, "then": "31-60 Days"},
+                {"case": {"$eq": ["$_id", 61]}, "then": "61-90 Days"}
+            ], "default": "Other"}},
+            "value": "$count", "_id": 0
+        }}
+    ]
+
+    at_risk_employees_pipeline = [
+        {"$match": at_risk_query},
+        {"$addFields": {
+            "daysLeft": {"$dateDiff": {"startDate": today, "endDate": "$resource_end_date", "unit": "day"}}
+        }},
+        {"$sort": {"daysLeft": 1}},
+        {"$limit": 5},
+        {"$project": {
+            "id": {"$toString": "$_id"},
+            "name": {"$concat": ["$first_name", " ", "$last_name"]},
+            "daysLeft": "$daysLeft",
+            "project": "$project", "_id": 0
+        }}
+    ]
+
+    results = await asyncio.gather(
+        timed("dashboard-total", list_read_collection.count_documents({})),
+        timed("dashboard-at-risk", list_read_collection.count_documents(at_risk_query)),
+        timed("dashboard-partial", list_read_collection.count_documents({"allocation": {"$lt": 100}})),
+        timed("dashboard-projects", list_read_collection.distinct("project")),
+        timed("dashboard-by-stream", list_read_collection.aggregate([{"$group": {"_id": "$stream", "value": {"$sum": 1}}}, {"$project": {"name": "$_id", "value": 1, "_id": 0}}]).to_list(length=None)),
+        timed("dashboard-by-project", list_read_collection.aggregate([{"$group": {"_id": "$project", "value": {"$sum": 1}}}, {"$project": {"name": "$_id", "value": 1, "_id": 0}}, {"$sort": {"value": -1}}]).to_list(length=None)),
+        timed("dashboard-expiring", list_read_collection.aggregate(expiring_contracts_pipeline).to_list(length=None)),
+        timed("dashboard-at-risk-list", list_read_collection.aggregate(at_risk_employees_pipeline).to_list(length=None)),
+        timed("dashboard-project-stream", list_read_collection.aggregate([{"$group": {"_id": {"project": "$project", "stream": "$stream"}, "count": {"$sum": 1}}}, {"$group": {"_id": "$_id.project", "streams": {"$push": {"k": "$_id.stream", "v": "$count"}}}}, {"$addFields": {"streams_obj": {"$arrayToObject": "$streams"}}}, {"$project": {"_id": 0, "project": "$_id", "Backend": {"$ifNull": ["$streams_obj.Backend", 0]}, "Frontend": {"$ifNull": ["$streams_obj.Frontend", 0]}, "QA": {"$ifNull": ["$streams_obj.QA", 0]}}}, {"$sort": {"project": 1}}]).to_list(length=None))
+    )
+
+    (total_headcount, at_risk_contracts, partially_allocated, active_projects, 
+     headcount_by_stream, headcount_per_project, expiring_contracts_breakdown, 
+     at_risk_employees, project_stream_distribution) = results
+
+    # Filter out "Other" bucket if it exists
+    expiring_contracts_breakdown = [b for b in expiring_contracts_breakdown if b.get("name") != "Other"]
+
+    return {
+        "kpis": {
+            "totalHeadcount": total_headcount,
+            "atRiskContracts": at_risk_contracts,
+            "partiallyAllocated": partially_allocated,
+            "activeProjects": len(active_projects)
+        },
+        "charts": {
+            "headcountByStream": headcount_by_stream,
+            "headcountPerProject": headcount_per_project,
+            "expiringContractsBreakdown": expiring_contracts_breakdown,
+            "projectStreamDistribution": project_stream_distribution
+        },
+        "atRiskEmployees": at_risk_employees
+    }
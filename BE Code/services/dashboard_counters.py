@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+from db.db import db, dashboard_counters_collection, list_collection, list_read_collection
+from services.normalize import to_api
+
+logger = logging.getLogger(__name__)
+
+_EXPIRING_BUCKETS = [(31, "Expired / 0-30 Days"), (61, "31-60 Days"), (91, "61-90 Days")]
+_DISTRIBUTION_STREAMS = ["Backend", "Frontend", "QA"]
+# Both names, so documents the schema migration hasn't reached yet count too.
+_COUNTED_FIELDS_PROJECTION = {
+    "allocation": 1, "stream": 1, "project": 1, "% Allocation": 1, "Stream": 1, "Project": 1,
+}
+_AT_RISK_PROJECTION = {"first_name": 1, "last_name": 1, "project": 1, "resource_end_date": 1}
+
+
+def _hashable(value: Any) -> Any:
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _sort_key(value: Any):
+    # Mongo sorts null before strings; mixed types fall back to their repr.
+    return (value is not None, value if isinstance(value, str) else repr(value))
+
+
+def _counter_keys(employee: Optional[dict]) -> List[dict]:
+    # The counters one employee document adds to, each named by its _id in dashboard_counters.
+    if not employee:
+        return []
+    employee = to_api(employee)
+    stream, project = employee.get("Stream"), employee.get("Project")
+    keys = [
+        {"kind": "total"},
+        {"kind": "stream", "stream": stream},
+        {"kind": "project", "project": project},
+        {"kind": "project_stream", "project": project, "stream": stream},
+    ]
+    # distinct("project") counts explicit nulls but not missing fields
+    if "Project" in employee:
+        keys.append({"kind": "project_value", "project": project})
+    allocation = employee.get("% Allocation")
+    if isinstance(allocation, (int, float)) and not isinstance(allocation, bool) and allocation < 100:
+        keys.append({"kind": "partial"})
+    return keys
+
+
+def _tally(changes: Iterable[Tuple[Optional[dict], Optional[dict]]]) -> Tuple[Dict[tuple, int], Dict[tuple, dict]]:
+    deltas: Dict[tuple, int] = {}
+    ids: Dict[tuple, dict] = {}
+    for before, after in changes:
+        for sign, employee in ((-1, before), (1, after)):
+            for key in _counter_keys(employee):
+                hashable = tuple((field, _hashable(value)) for field, value in key.items())
+                deltas[hashable] = deltas.get(hashable, 0) + sign
+                ids.setdefault(hashable, key)
+    return deltas, ids
+
+
+async def apply_dashboard_deltas(changes: Iterable[Tuple[Optional[dict], Optional[dict]]]):
+    """
+    Adjusts the dashboard counters for employees going from `before` to `after`, netted
+    into one bulk write. Like the skill counts, a failure is logged rather than raised;
+    POST /dashboard-counters/recount repairs the drift.
+    """
+    deltas, ids = _tally(changes)
+    operations = [
+        UpdateOne({"_id": ids[key]}, {"$inc": {"count": delta}}, upsert=True)
+        for key, delta in deltas.items() if delta
+    ]
+    if operations:
+        try:
+            await dashboard_counters_collection.bulk_write(operations, ordered=False)
+        except PyMongoError:
+            logger.exception("Updating the dashboard counters failed; they drift until the next recount")
+
+
+async def apply_dashboard_delta(before: Optional[dict], after: Optional[dict]):
+    """Adjusts the dashboard counters for one employee going from `before` to `after`."""
+    await apply_dashboard_deltas([(before, after)])
+
+
+async def rebuild_dashboard_counters():
+    # Full recount, for startup, after a migration rewrote documents, and for the admin repair.
+    # Counted with the same keys the deltas use, then swapped in by a rename; $inc's that land
+    # while it runs are lost, as with rebuild_skill_counts.
+    counts: Dict[tuple, int] = {}
+    ids: Dict[tuple, dict] = {}
+    async for document in list_collection.find({}, _COUNTED_FIELDS_PROJECTION):
+        deltas, keys = _tally([(None, document)])
+        for key, delta in deltas.items():
+            counts[key] = counts.get(key, 0) + delta
+            ids.setdefault(key, keys[key])
+
+    staging = db[f"{dashboard_counters_collection.name}_rebuild"]
+    await staging.drop()
+    if not counts:
+        await dashboard_counters_collection.drop()
+        return
+    await staging.insert_many([{"_id": ids[key], "count": count} for key, count in counts.items()], ordered=False)
+    await staging.rename(dashboard_counters_collection.name, dropTarget=True)
+
+
+async def summarize_counters(today: datetime) -> dict:
+    """
+    The /dashboard-summary figures from the maintained counters. The date-relative ones
+    (at-risk count and list, expiring buckets) can't be kept as counters, so they are
+    range counts on the resource_end_date index instead.
+    """
+    thirty_days_from_now = today + timedelta(days=30)
+    ninety_days_from_now = today + timedelta(days=90)
+    # Days left is counted in whole dates, so each bucket starts at a midnight; the last
+    # one stops at the 90-day cut-off like the aggregation's $match does.
+    bucket_ranges = [
+        {"$lt": today + timedelta(days=_EXPIRING_BUCKETS[0][0])},
+        {"$gte": today + timedelta(days=_EXPIRING_BUCKETS[0][0]), "$lt": today + timedelta(days=_EXPIRING_BUCKETS[1][0])},
+        {"$gte": today + timedelta(days=_EXPIRING_BUCKETS[1][0]), "$lte": ninety_days_from_now},
+    ]
+    at_risk_query = {"resource_end_date": {"$lte": thirty_days_from_now}}
+
+    counters, at_risk, at_risk_rows, *bucket_counts = await asyncio.gather(
+        dashboard_counters_collection.find({"count": {"$gt": 0}}).to_list(length=None),
+        list_read_collection.count_documents(at_risk_query),
+        list_read_collection.find(at_risk_query, _AT_RISK_PROJECTION)
+        .sort([("resource_end_date", ASCENDING), ("_id", ASCENDING)]).limit(5).to_list(length=5),
+        *(list_read_collection.count_documents({"resource_end_date": bucket}) for bucket in bucket_ranges)
+    )
+
+    total = partial = active_projects = 0
+    by_stream: List[dict] = []
+    by_project: List[dict] = []
+    projects: Dict[Any, Dict[str, int]] = {}
+    for counter in counters:
+        key, count = counter["_id"], counter["count"]
+        kind = key["kind"]
+        if kind == "total":
+            total = count
+        elif kind == "partial":
+            partial = count
+        elif kind == "project_value":
+            active_projects += 1
+        elif kind == "stream":
+            by_stream.append({"name": key["stream"], "value": count})
+        elif kind == "project":
+            by_project.append({"name": key["project"], "value": count})
+        elif kind == "project_stream":
+            streams = projects.setdefault(_hashable(key["project"]), {name: 0 for name in _DISTRIBUTION_STREAMS})
+            if key["stream"] in streams:
+                streams[key["stream"]] += count
+
+    at_risk_employees = [
+        {
+            "id": str(row["_id"]),
+            "name": f"{row['first_name']} {row['last_name']}"
+            if isinstance(row.get("first_name"), str) and isinstance(row.get("last_name"), str) else None,
+            "daysLeft": (row["resource_end_date"].date() - today.date()).days,
+            "project": row.get("project"),
+        }
+        for row in at_risk_rows
+    ]
+
+    return {
+        "kpis": {
+            "totalHeadcount": total,
+            "atRiskContracts": at_risk,
+            "partiallyAllocated": partial,
+            "activeProjects": active_projects
+        },
+        "charts": {
+            "headcountByStream": by_stream,
+            "headcountPerProject": sorted(by_project, key=lambda entry: -entry["value"]),
+            "expiringContractsBreakdown": [
+                {"name": name, "value": count} for (_, name), count in zip(_EXPIRING_BUCKETS, bucket_counts) if count
+            ],
+            "projectStreamDistribution": [
+                {"project": list(project) if isinstance(project, tuple) else project, **streams}
+                for project, streams in sorted(projects.items(), key=lambda item: _sort_key(item[0]))
+            ]
+        },
+        "atRiskEmployees": at_risk_employees
+    }
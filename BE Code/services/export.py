@@ -0,0 +1,113 @@
+import asyncio
+import csv
+import tempfile
+from datetime import datetime
+from io import StringIO
+from typing import IO, AsyncIterator, List, Optional
+
+from bson import ObjectId
+from openpyxl import Workbook
+
+from config.config import export_batch_size
+from models.models import Employee
+from services.normalize import INTERNAL_FIELDS_PROJECTION, to_api
+from services.offload import run_cpu
+
+# Columns come from the model so that a document missing a field still gets an (empty) cell.
+EXPORT_COLUMNS = ["_id"] + [field.alias for field in Employee.model_fields.values()]
+# Everything but the internal fields, so documents still in the old schema export the same.
+EXPORT_PROJECTION = INTERNAL_FIELDS_PROJECTION
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv"
+
+
+def export_row(emp: dict, today: datetime) -> list:
+    emp = to_api(emp)
+    end_date = emp.get("Resource End date")
+    if end_date and isinstance(end_date, datetime):
+        emp["Countdown"] = (end_date - today).days
+    else:
+        emp["Countdown"] = None
+
+    row_data = []
+    for col in EXPORT_COLUMNS:
+        value = emp.get(col)
+        if isinstance(value, ObjectId):
+            row_data.append(str(value))
+        elif isinstance(value, list):
+            row_data.append(", ".join(map(str, value)))
+        elif isinstance(value, datetime):
+            row_data.append(value.strftime("%d/%m/%Y"))
+        else:
+            row_data.append(value)
+    return row_data
+
+
+async def iter_batches(cursor, first_batch: List[dict], batch_size: int = export_batch_size) -> AsyncIterator[List[dict]]:
+    # The next batch is requested before this one is handed out, so the fetch overlaps with
+    # whatever the consumer does with it.
+    batch = first_batch
+    next_batch = None
+    try:
+        while batch:
+            next_batch = asyncio.ensure_future(cursor.to_list(length=batch_size))
+            yield batch
+            batch = await next_batch
+    finally:
+        if next_batch is not None and not next_batch.done():
+            next_batch.cancel()
+
+
+def csv_chunk(batch: List[dict], today: datetime, header: bool = False) -> bytes:
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for emp in batch:
+        writer.writerow(export_row(emp, today))
+    return buffer.getvalue().encode("utf-8")
+
+
+async def stream_csv(cursor, first_batch: List[dict], today: datetime) -> AsyncIterator[bytes]:
+    header = True
+    async for batch in iter_batches(cursor, first_batch):
+        # Row formatting runs on the CPU pool while iter_batches fetches the next batch.
+        yield await run_cpu(csv_chunk, batch, today, header)
+        header = False
+
+
+def _append_rows(ws, batch: List[dict], today: datetime):
+    for emp in batch:
+        ws.append(export_row(emp, today))
+
+
+async def build_xlsx(cursor, first_batch: List[dict], today: datetime, output: Optional[IO[bytes]] = None) -> IO[bytes]:
+    """
+    Writes the workbook to `output` (a temporary file by default) and returns it
+    rewound. A write-only workbook spills rows to disk as they are appended, so
+    memory stays flat; the openpyxl work runs on the CPU pool, one step at a time,
+    so the event loop keeps serving other requests.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Employees")
+    ws.append(EXPORT_COLUMNS)
+    async for batch in iter_batches(cursor, first_batch):
+        await run_cpu(_append_rows, ws, batch, today)
+
+    output = output or tempfile.TemporaryFile()
+    try:
+        await run_cpu(wb.save, output)
+        output.seek(0)
+    except BaseException:
+        output.close()
+        raise
+    return output
+
+
+async def iter_file(output: IO[bytes], chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    try:
+        while chunk := output.read(chunk_size):
+            yield chunk
+    finally:
+        output.close()
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from config.config import (
+    job_storage_dir, job_heartbeat_seconds, job_stale_after_seconds, job_max_attempts, job_retention_hours
+)
+from db.db import jobs_collection
+from services.offload import queued_cpu_job
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+UNFINISHED = [QUEUED, RUNNING]
+
+# A runner gets the job document and a mutable progress dict that is flushed on every
+# heartbeat, and returns the fields to store on completion (result, artifact). It removes
+# its own partial output if it fails or is cancelled.
+JobRunner = Callable[[dict, dict], Awaitable[dict]]
+JOB_RUNNERS: Dict[str, JobRunner] = {}
+
+# Identifies this worker process as the owner of the jobs it runs.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_tasks: Dict[ObjectId, asyncio.Task] = {}
+# Why a local job task was cancelled: "cancelled" by a user, "lost" ownership, or "shutdown".
+_cancel_reasons: Dict[ObjectId, str] = {}
+_sweeper_task: Optional[asyncio.Task] = None
+
+
+def register_job_runner(kind: str, runner: JobRunner):
+    JOB_RUNNERS[kind] = runner
+
+
+def job_file_path(job_id: ObjectId, suffix: str) -> str:
+    os.makedirs(job_storage_dir, exist_ok=True)
+    return os.path.join(job_storage_dir, f"{job_id}{suffix}")
+
+
+def _remove_file(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def job_helper(job: dict) -> dict:
+    # Local file paths stay internal; clients download through the API.
+    artifact = job.get("artifact")
+    return {
+        "id": str(job["_id"]),
+        "kind": job["kind"],
+        "status": job["status"],
+        "params": job.get("params", {}),
+        "progress": job.get("progress", {}),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "cancel_requested": job.get("cancel_requested", False),
+        "attempts": job.get("attempts", 0),
+        "artifact": {k: artifact[k] for k in ("filename", "media_type", "size")} if artifact else None,
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+    }
+
+
+async def submit_job(kind: str, params: dict, job_id: Optional[ObjectId] = None, input_path: Optional[str] = None) -> dict:
+    if kind not in JOB_RUNNERS:
+        raise ValueError(f"Unknown job kind '{kind}'")
+    now = datetime.utcnow()
+    job = {
+        "_id": job_id or ObjectId(),
+        "kind": kind,
+        "status": QUEUED,
+        "params": params,
+        "input_path": input_path,
+        "progress": {},
+        "cancel_requested": False,
+        "attempts": 0,
+        "owner": WORKER_ID,
+        "heartbeat_at": now,
+        "created_at": now,
+    }
+    await jobs_collection.insert_one(job)
+    _start(job)
+    return job
+
+
+async def get_job(job_id: ObjectId) -> Optional[dict]:
+    return await jobs_collection.find_one({"_id": job_id})
+
+
+async def cancel_job(job_id: ObjectId) -> Optional[dict]:
+    # A queued job nobody has started yet can be cancelled outright.
+    job = await jobs_collection.find_one_and_update(
+        {"_id": job_id, "status": QUEUED, "owner": None},
+        {"$set": {"status": CANCELLED, "cancel_requested": True, "finished_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if job:
+        _remove_file(job.get("input_path"))
+        return job
+
+    # Otherwise flag it; the owning worker sees the flag on its next heartbeat.
+    job = await jobs_collection.find_one_and_update(
+        {"_id": job_id, "status": {"$in": UNFINISHED}},
+        {"$set": {"cancel_requested": True}},
+        return_document=ReturnDocument.AFTER
+    )
+    if job and job_id in _tasks:
+        _cancel_local(job_id, "cancelled")
+    return job or await get_job(job_id)
+
+
+def _cancel_local(job_id: ObjectId, reason: str):
+    task = _tasks.get(job_id)
+    if task and not task.done():
+        _cancel_reasons.setdefault(job_id, reason)
+        task.cancel()
+
+
+def _start(job: dict):
+    _tasks[job["_id"]] = asyncio.create_task(_run(job))
+
+
+async def _heartbeat(job_id: ObjectId, progress: dict):
+    while True:
+        await asyncio.sleep(job_heartbeat_seconds)
+        job = await jobs_collection.find_one_and_update(
+            {"_id": job_id, "owner": WORKER_ID},
+            {"$set": {"progress": progress, "heartbeat_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            # The sweeper on another worker decided this one was dead and took the job over.
+            _cancel_local(job_id, "lost")
+            return
+        if job.get("cancel_requested"):
+            _cancel_local(job_id, "cancelled")
+            return
+
+
+async def _finish(job_id: ObjectId, fields: dict):
+    await jobs_collection.update_one(
+        {"_id": job_id, "owner": WORKER_ID},
+        {"$set": {**fields, "finished_at": datetime.utcnow(), "heartbeat_at": datetime.utcnow()}}
+    )
+
+
+async def _run(job: dict):
+    job_id = job["_id"]
+    progress: Dict[str, Any] = {}
+    heartbeat = asyncio.create_task(_heartbeat(job_id, progress))
+    outcome = None
+    try:
+        # Jobs share the export/import slots with the synchronous endpoints, but wait for one.
+        async with queued_cpu_job():
+            await jobs_collection.update_one(
+                {"_id": job_id, "owner": WORKER_ID},
+                {"$set": {"status": RUNNING, "started_at": datetime.utcnow()}, "$inc": {"attempts": 1}}
+            )
+            fields = await JOB_RUNNERS[job["kind"]](job, progress)
+        outcome = COMPLETED
+        await _finish(job_id, {"status": COMPLETED, "progress": progress, **fields})
+    except asyncio.CancelledError:
+        reason = _cancel_reasons.get(job_id, "shutdown")
+        if reason == "cancelled":
+            outcome = CANCELLED
+            await _finish(job_id, {"status": CANCELLED, "progress": progress})
+        elif reason == "shutdown":
+            # Hand the job back so the next worker to sweep picks it up straight away.
+            await jobs_collection.update_one(
+                {"_id": job_id, "owner": WORKER_ID},
+                {"$set": {"status": QUEUED, "owner": None, "heartbeat_at": None, "progress": progress}}
+            )
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job_id, job["kind"])
+        outcome = FAILED
+        await _finish(job_id, {"status": FAILED, "progress": progress, "error": str(e)})
+    finally:
+        heartbeat.cancel()
+        _tasks.pop(job_id, None)
+        _cancel_reasons.pop(job_id, None)
+
+    if outcome is not None:
+        _remove_file(job.get("input_path"))
+
+
+async def _claim_stale_job() -> Optional[dict]:
+    cutoff = datetime.utcnow() - timedelta(seconds=job_stale_after_seconds)
+    return await jobs_collection.find_one_and_update(
+        {
+            "status": {"$in": UNFINISHED},
+            "_id": {"$nin": list(_tasks)},
+            "$or": [{"heartbeat_at": None}, {"heartbeat_at": {"$lt": cutoff}}],
+        },
+        {"$set": {"status": QUEUED, "owner": WORKER_ID, "heartbeat_at": datetime.utcnow()}},
+        sort=[("heartbeat_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def sweep_jobs():
+    # Resume jobs whose worker died or shut down; imports re-upsert from the saved upload
+    # (upserts are idempotent) and exports are regenerated.
+    while job := await _claim_stale_job():
+        if job.get("cancel_requested") or job.get("attempts", 0) >= job_max_attempts:
+            error = None if job.get("cancel_requested") else "Gave up after the worker running it stopped repeatedly"
+            await _finish(job["_id"], {"status": CANCELLED if error is None else FAILED, "error": error})
+            _remove_file(job.get("input_path"))
+            continue
+        logger.info("Resuming job %s (%s)", job["_id"], job["kind"])
+        _start(job)
+
+    # Expire finished jobs along with their files.
+    cutoff = datetime.utcnow() - timedelta(hours=job_retention_hours)
+    expired = {"status": {"$nin": UNFINISHED}, "finished_at": {"$lt": cutoff}}
+    async for job in jobs_collection.find(expired, {"input_path": 1, "artifact": 1}):
+        _remove_file(job.get("input_path"))
+        _remove_file((job.get("artifact") or {}).get("path"))
+    await jobs_collection.delete_many(expired)
+
+
+async def _sweep_forever():
+    while True:
+        try:
+            await sweep_jobs()
+        except Exception:
+            logger.exception("Job sweep failed")
+        await asyncio.sleep(max(1.0, job_stale_after_seconds / 2))
+
+
+def start_jobs():
+    global _sweeper_task
+    _sweeper_task = asyncio.create_task(_sweep_forever())
+
+
+async def stop_jobs():
+    tasks = list(_tasks.values())
+    if _sweeper_task:
+        tasks.append(_sweeper_task)
+    for job_id in list(_tasks):
+        _cancel_local(job_id, "shutdown")
+    if _sweeper_task:
+        _sweeper_task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,121 @@
+import codecs
+import json
+from typing import Any, AsyncIterator
+
+from fastapi import UploadFile
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = set("0123456789+-.eE")
+
+
+class _ChunkReader:
+    """Text buffer over an UploadFile that is refilled one chunk at a time."""
+
+    def __init__(self, file: UploadFile, chunk_size: int):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    async def fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = await self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            self.buffer = self.buffer[self.pos:] + self.utf8.decode(b"", final=True)
+        else:
+            # Drop everything already consumed so the buffer only holds the unparsed tail.
+            self.buffer = self.buffer[self.pos:] + self.utf8.decode(chunk)
+        self.pos = 0
+        return True
+
+    async def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not await self.fill():
+                return ""
+
+    async def expect(self, char: str, error: str):
+        if await self.peek() != char:
+            raise ValueError(error)
+        self.pos += 1
+
+    async def value(self) -> Any:
+        await self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A number that runs up to the buffer edge may continue in the next chunk.
+                truncated = isinstance(value, (int, float)) and set(self.buffer[end:]) <= _NUMBER_CHARS
+                if not truncated or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            await self.fill()
+
+
+async def iter_json_array_items(
+    file: UploadFile, key: str = "resources", chunk_size: int = 64 * 1024
+) -> AsyncIterator[Any]:
+    """
+    Yields the elements of the top-level `key` array of a JSON object upload
+    without reading the whole file into memory. Raises the same ValueErrors as
+    the json.loads based import for a missing key or a non-list value, and rejects
+    what json.loads rejects. A repeated `key`, where json.loads would keep the last
+    array, is an error here: the first one has already been yielded by then.
+    """
+    reader = _ChunkReader(file, chunk_size)
+    missing_key = f"Invalid JSON format: must contain a '{key}' key."
+
+    await reader.expect("{", missing_key)
+    found = False
+    after_comma = False
+    while True:
+        char = await reader.peek()
+        if char == "}" and not after_comma:
+            reader.pos += 1
+            break
+        if char != '"':
+            raise json.JSONDecodeError("Expecting property name enclosed in double quotes", reader.buffer, reader.pos)
+        name = await reader.value()
+        await reader.expect(":", "Invalid JSON format: expecting ':' delimiter.")
+
+        if name == key and found:
+            raise ValueError(f"Invalid JSON format: duplicate '{key}' key.")
+        if name == key:
+            found = True
+            await reader.expect("[", f"'{key}' key must contain a list.")
+            if await reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield await reader.value()
+                    char = await reader.peek()
+                    reader.pos += 1
+                    if char == "]":
+                        break
+                    if char != ",":
+                        raise ValueError(f"Invalid JSON format: malformed '{key}' list.")
+        else:
+            await reader.value()
+
+        char = await reader.peek()
+        after_comma = char == ","
+        if after_comma:
+            reader.pos += 1
+        elif char != "}":
+            raise ValueError("Invalid JSON format: expecting ',' delimiter.")
+
+    if await reader.peek() != "":
+        raise ValueError("Invalid JSON format: extra data after the top-level object.")
+    if not found:
+        raise ValueError(missing_key)
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from pymongo.errors import OperationFailure
+
+from config.config import (
+    live_poll_interval, live_batch_window, live_max_rows_per_event, live_subscriber_queue
+)
+from db.db import list_collection
+from services.cache import next_midnight
+from services.dashboard_counters import summarize_counters
+from services.normalize import INTERNAL_FIELDS_PROJECTION, to_api
+from services.roster import roster_version
+from services.responses import dumps
+
+logger = logging.getLogger(__name__)
+
+# "The $changeStream stage is only supported on replica sets"
+_CHANGE_STREAMS_UNSUPPORTED = 40573
+_CHANGE_OPS = {"insert": "insert", "update": "update", "replace": "update", "delete": "delete"}
+
+
+def _today() -> datetime:
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _public_row(row: dict, today: datetime) -> dict:
+    # Same shape as the /employees rows, with the derived Countdown.
+    employee = to_api(row)
+    end_date = employee.get("Resource End date")
+    employee["Countdown"] = (end_date - today).days if isinstance(end_date, datetime) else None
+    return employee
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+
+class LiveFeed:
+    """
+    One per worker: follows list_collection's change stream (or polls a standalone
+    server) and fans coalesced row deltas plus the dashboard summary out to every
+    subscriber as server-sent events. The summary comes from the counters the write
+    paths maintain in Mongo, so no worker holds a copy of the roster; changed rows are
+    fetched in full once per flush.
+    """
+
+    def __init__(self):
+        self.mode: Optional[str] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._pending: Dict[Any, str] = {}
+        self._resync = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+
+    # --- changes ---
+
+    def _record(self, row_id: Any, op: str):
+        previous = self._pending.get(row_id)
+        if previous == "insert":
+            # Subscribers never saw this row; they still need to hear about it as new, or not at all.
+            if op == "delete":
+                del self._pending[row_id]
+                op = None
+            else:
+                op = "insert"
+        elif previous == "delete" and op == "insert":
+            op = "update"
+        if op is not None:
+            self._pending[row_id] = op
+        self._schedule_flush()
+
+    def _record_resync(self):
+        # Something changed but not which rows: subscribers refetch what they show.
+        self._resync = True
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    # --- publishing ---
+
+    async def summary(self) -> dict:
+        return await summarize_counters(_today())
+
+    async def _flush_later(self):
+        # Changes that arrive while a flush is fetching rows go out in the next round.
+        while True:
+            await asyncio.sleep(live_batch_window)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Publishing live changes failed")
+            if not self._pending and not self._resync:
+                return
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        resync, self._resync = self._resync, False
+        if not pending and not resync:
+            return
+        today = _today()
+        if resync or len(pending) > live_max_rows_per_event:
+            changes, resync = None, True
+        else:
+            changed_ids = [row_id for row_id, op in pending.items() if op != "delete"]
+            employees = {}
+            if changed_ids:
+                async for document in list_collection.find({"_id": {"$in": changed_ids}}, INTERNAL_FIELDS_PROJECTION):
+                    employees[document["_id"]] = _public_row(document, today)
+            # A row deleted since its change arrived goes out as a delete; that delete follows anyway.
+            changes = [
+                {"op": op if row_id in employees else "delete", "id": str(row_id), "employee": employees.get(row_id)}
+                for row_id, op in pending.items()
+            ]
+        summary = await summarize_counters(today)
+        self._broadcast(_sse("changes", {"changes": changes, "resync": resync, "summary": summary}), summary)
+
+    def _broadcast(self, message: str, summary: dict):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too far behind for deltas to help; replace the backlog with a resync.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot_event(summary, resync=True))
+
+    def _snapshot_event(self, summary: dict, resync: bool = False) -> str:
+        return _sse("snapshot", {"mode": self.mode, "resync": resync, "summary": summary})
+
+    # --- sources ---
+
+    async def _follow_change_stream(self):
+        # Only which rows changed matters here; flush() reads them and the counters fresh.
+        pipeline = [{"$project": {"operationType": 1, "documentKey": 1}}]
+        async with list_collection.watch(pipeline) as stream:
+            self.mode = "change-stream"
+            if self._ready.is_set():
+                # Reconnected: whatever happened while the stream was down is unknown.
+                self._record_resync()
+            self._ready.set()
+            async for change in stream:
+                operation = change["operationType"]
+                if operation in _CHANGE_OPS:
+                    self._record(change["documentKey"]["_id"], _CHANGE_OPS[operation])
+                elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+                    return
+
+    async def _poll(self):
+        # Without a change stream, the change counter is the cheap way to tell whether
+        # anything was written since the last look; it doesn't say what, so that is a resync.
+        self.mode = "polling"
+        last_version = await roster_version()
+        self._ready.set()
+        while True:
+            await asyncio.sleep(live_poll_interval)
+            version = await roster_version()
+            if version != last_version:
+                last_version = version
+                self._record_resync()
+
+    async def _run(self):
+        while True:
+            try:
+                if self.mode == "polling":
+                    await self._poll()
+                await self._follow_change_stream()
+            except asyncio.CancelledError:
+                raise
+            except (OperationFailure, NotImplementedError) as e:
+                if isinstance(e, NotImplementedError) or e.code == _CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info("Change streams unavailable; polling list_collection every %ss", live_poll_interval)
+                    self.mode = "polling"
+                    continue
+                logger.exception("Live update source failed; reconnecting")
+                await asyncio.sleep(1)
+            except Exception:
+                logger.exception("Live update source failed; reconnecting")
+                await asyncio.sleep(1)
+
+    async def _roll_over_at_midnight(self):
+        # The date-relative figures change at midnight even when no row does.
+        while True:
+            await asyncio.sleep((next_midnight() - datetime.now()).total_seconds() + 1)
+            try:
+                summary = await self.summary()
+            except Exception:
+                logger.exception("Publishing the midnight summary failed")
+                continue
+            self._broadcast(_sse("changes", {"changes": [], "resync": False, "summary": summary}), summary)
+
+    # --- subscribers ---
+
+    async def subscribe(self, timeout: float) -> asyncio.Queue:
+        """Raises asyncio.TimeoutError if the update source isn't ready within `timeout`."""
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._task = asyncio.gather(self._run(), self._roll_over_at_midnight())
+        await asyncio.wait_for(self._ready.wait(), timeout)
+        queue = asyncio.Queue(maxsize=max(1, live_subscriber_queue))
+        queue.put_nowait(self._snapshot_event(await self.summary()))
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    async def stop(self):
+        for task in (self._task, self._flush_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._task = None
+        self._flush_task = None
+
+
+live_feed = LiveFeed()
@@ -0,0 +1,389 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+import bson
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+
+from config.config import (
+    metrics_flush_seconds, metrics_mongo_payload_sizes, metrics_multiprocess_dir, server_timing_enabled,
+    slow_query_explain, slow_query_log_ms
+)
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("slow_query")
+
+DURATION_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+_EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct"}
+# Session and routing fields the server rejects inside an explain.
+_EXPLAIN_STRIPPED_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "apiVersion", "apiStrict"}
+_COUNTERS = ["requests", "response_bytes", "commands", "documents_returned", "documents_examined", "reply_bytes"]
+_HISTOGRAMS = ["request_durations", "command_durations", "step_durations"]
+
+_flush_task: Optional[asyncio.Task] = None
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+
+
+class RequestTimings:
+    """Mongo activity attributed to the HTTP request currently being served."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_command: Dict[str, List[float]] = {}
+        self.steps: List[Tuple[str, float]] = []
+
+    def add(self, command: str, seconds: float):
+        with self.lock:
+            entry = self.by_command.setdefault(command, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def server_timing(self, total_seconds: float) -> str:
+        with self.lock:
+            parts = [f"app;dur={total_seconds * 1000:.1f}"]
+            if self.by_command:
+                mongo_ops = sum(int(count) for count, _ in self.by_command.values())
+                mongo_seconds = sum(seconds for _, seconds in self.by_command.values())
+                parts.append(f'mongo;dur={mongo_seconds * 1000:.1f};desc="{mongo_ops} ops"')
+                for command, (count, seconds) in sorted(self.by_command.items()):
+                    parts.append(f'mongo-{command};dur={seconds * 1000:.1f};desc="{int(count)}x"')
+            for label, seconds in self.steps:
+                parts.append(f"{label};dur={seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current_request: ContextVar[Optional[RequestTimings]] = ContextVar("current_request", default=None)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.request_durations: Dict[Tuple[str, str], _Histogram] = {}
+        self.response_bytes: Dict[Tuple[str, str], int] = {}
+        self.commands: Dict[Tuple[str, str, str], int] = {}
+        self.command_durations: Dict[Tuple[str, str], _Histogram] = {}
+        self.documents_returned: Dict[Tuple[str, str], int] = {}
+        self.documents_examined: Dict[Tuple[str, str], int] = {}
+        self.reply_bytes: Dict[Tuple[str, str], int] = {}
+        self.step_durations: Dict[Tuple[str], _Histogram] = {}
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, response_bytes: int):
+        with self._lock:
+            key = (method, route)
+            self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+            self.request_durations.setdefault(key, _Histogram()).observe(seconds)
+            self.response_bytes[key] = self.response_bytes.get(key, 0) + response_bytes
+
+    def observe_command(self, command: str, collection: str, outcome: str, seconds: float, returned: int, reply_bytes: int):
+        with self._lock:
+            key = (command, collection)
+            self.commands[(command, collection, outcome)] = self.commands.get((command, collection, outcome), 0) + 1
+            self.command_durations.setdefault(key, _Histogram()).observe(seconds)
+            self.documents_returned[key] = self.documents_returned.get(key, 0) + returned
+            if reply_bytes:
+                self.reply_bytes[key] = self.reply_bytes.get(key, 0) + reply_bytes
+
+    def observe_step(self, step: str, seconds: float):
+        with self._lock:
+            self.step_durations.setdefault((step,), _Histogram()).observe(seconds)
+
+    def observe_examined(self, command: str, collection: str, examined: int):
+        with self._lock:
+            key = (command, collection)
+            self.documents_examined[key] = self.documents_examined.get(key, 0) + examined
+
+    def state(self) -> dict:
+        """Every series as JSON-friendly lists, for merging across worker processes."""
+        with self._lock:
+            state = {name: [[list(labels), value] for labels, value in getattr(self, name).items()] for name in _COUNTERS}
+            for name in _HISTOGRAMS:
+                state[name] = [[list(labels), hist.buckets, hist.count, hist.sum] for labels, hist in getattr(self, name).items()]
+        return state
+
+    def merge(self, state: dict):
+        with self._lock:
+            for name in _COUNTERS:
+                values = getattr(self, name)
+                for labels, value in state.get(name, []):
+                    values[tuple(labels)] = values.get(tuple(labels), 0) + value
+            for name in _HISTOGRAMS:
+                values = getattr(self, name)
+                for labels, buckets, count, total in state.get(name, []):
+                    hist = values.setdefault(tuple(labels), _Histogram())
+                    hist.buckets = [mine + theirs for mine, theirs in zip(hist.buckets, buckets)]
+                    hist.count += count
+                    hist.sum += total
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def counter(name: str, help_text: str, values: Dict[tuple, float], label_names: Tuple[str, ...]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(values.items()):
+                lines.append(f"{name}{_labels(label_names, labels)} {value}")
+
+        def histogram(name: str, help_text: str, values: Dict[tuple, _Histogram], label_names: Tuple[str, ...]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in sorted(values.items()):
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, hist.buckets):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(label_names + ('le',), labels + (bound,))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(label_names + ('le',), labels + ('+Inf',))} {hist.count}")
+                lines.append(f"{name}_sum{_labels(label_names, labels)} {hist.sum}")
+                lines.append(f"{name}_count{_labels(label_names, labels)} {hist.count}")
+
+        with self._lock:
+            counter("http_requests_total", "HTTP requests by route and status.", self.requests, ("method", "route", "status"))
+            histogram("http_request_duration_seconds", "HTTP request latency.", self.request_durations, ("method", "route"))
+            counter("http_response_size_bytes_total", "HTTP response body bytes.", self.response_bytes, ("method", "route"))
+            counter("mongodb_commands_total", "MongoDB commands by outcome.", self.commands, ("command", "collection", "outcome"))
+            histogram("mongodb_command_duration_seconds", "MongoDB command latency.", self.command_durations, ("command", "collection"))
+            counter("mongodb_documents_returned_total", "Documents returned or affected by MongoDB commands.", self.documents_returned, ("command", "collection"))
+            counter("mongodb_documents_examined_total", "Documents examined by slow commands (from explain).", self.documents_examined, ("command", "collection"))
+            counter("mongodb_reply_size_bytes_total", "BSON size of MongoDB replies.", self.reply_bytes, ("command", "collection"))
+            histogram("app_step_duration_seconds", "Latency of named steps inside handlers.", self.step_durations, ("step",))
+        return "\n".join(lines) + "\n"
+
+
+def _labels(names: Tuple[str, ...], values: tuple) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+registry = MetricsRegistry()
+
+
+# --- Multiple worker processes ---
+
+def write_worker_metrics():
+    # Replaced atomically, so a worker reading the directory never sees a half-written file.
+    path = os.path.join(metrics_multiprocess_dir, f"{os.getpid()}.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(registry.state(), f)
+    os.replace(f"{path}.tmp", path)
+
+
+def render_metrics() -> str:
+    """
+    This process's metrics, or with serve.py's workers the sum over every worker, so one
+    scrape through the shared port covers them all. Other workers' figures are at most
+    metrics_flush_seconds old; those of stopped workers stay in, keeping counters monotonic.
+    """
+    if not metrics_multiprocess_dir:
+        return registry.render()
+    write_worker_metrics()
+    combined = MetricsRegistry()
+    for path in glob.glob(os.path.join(metrics_multiprocess_dir, "*.json")):
+        try:
+            with open(path) as f:
+                combined.merge(json.load(f))
+        except (OSError, ValueError):
+            logger.warning("Skipping unreadable metrics file %s", path)
+    return combined.render()
+
+
+async def _flush_forever():
+    while True:
+        await asyncio.sleep(metrics_flush_seconds)
+        try:
+            write_worker_metrics()
+        except OSError:
+            logger.exception("Could not write worker metrics")
+
+
+def start_metrics_flush():
+    global _flush_task
+    if metrics_multiprocess_dir:
+        _flush_task = asyncio.create_task(_flush_forever())
+
+
+async def stop_metrics_flush():
+    if _flush_task and not _flush_task.done():
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        write_worker_metrics()
+
+
+async def timed(step: str, awaitable):
+    """Awaits `awaitable`, recording its latency as a named step of the current request."""
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        seconds = time.perf_counter() - started
+        registry.observe_step(step, seconds)
+        timings = _current_request.get()
+        if timings is not None:
+            with timings.lock:
+                timings.steps.append((step, seconds))
+
+
+# --- Mongo command monitoring ---
+
+def _collection_name(command_name: str, command: dict) -> str:
+    if command_name == "getMore":
+        return str(command.get("collection", ""))
+    target = command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+
+def _documents_returned(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if "values" in reply:
+        return len(reply["values"])
+    n = reply.get("n")
+    return n if isinstance(n, int) else 0
+
+
+def _find_docs_examined(explain: dict) -> Optional[int]:
+    # The counter sits at different depths for find, count and (possibly sharded) aggregate plans.
+    if isinstance(explain, dict):
+        if isinstance(explain.get("totalDocsExamined"), int):
+            return explain["totalDocsExamined"]
+        values = explain.values()
+    elif isinstance(explain, list):
+        values = explain
+    else:
+        return None
+    found = [n for n in (_find_docs_examined(value) for value in values) if n is not None]
+    return sum(found) if found else None
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[tuple, tuple] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        collection = _collection_name(event.command_name, event.command)
+        # The command document is only kept when it may be needed for a slow-query explain.
+        command = event.command if slow_query_log_ms > 0 and slow_query_explain else None
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = (collection, command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, "success", event.reply)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event, "failure", {})
+
+    def _finish(self, event, outcome: str, reply: dict):
+        with self._lock:
+            collection, command = self._pending.pop((event.request_id, event.connection_id), ("", None))
+        seconds = event.duration_micros / 1_000_000
+        returned = _documents_returned(reply)
+        reply_bytes = len(bson.encode(reply)) if metrics_mongo_payload_sizes and reply else 0
+        registry.observe_command(event.command_name, collection, outcome, seconds, returned, reply_bytes)
+
+        timings = _current_request.get()
+        if timings is not None:
+            timings.add(event.command_name, seconds)
+
+        if slow_query_log_ms > 0 and seconds * 1000 >= slow_query_log_ms and event.command_name != "explain":
+            slow_query_logger.warning(
+                "%s %s.%s took %.1f ms, %s, returned %d documents",
+                event.command_name, event.database_name, collection, seconds * 1000, outcome, returned
+            )
+            if command is not None and event.command_name in _EXPLAINABLE_COMMANDS and self.loop is not None:
+                self.loop.call_soon_threadsafe(
+                    asyncio.ensure_future,
+                    _explain_slow_command(event.command_name, event.database_name, collection, command)
+                )
+
+
+async def _explain_slow_command(command_name: str, database_name: str, collection: str, command: dict):
+    pipeline = command.get("pipeline") or []
+    if any("$out" in stage or "$merge" in stage for stage in pipeline):
+        return
+    from db.db import get_client
+
+    try:
+        explain_command = {key: value for key, value in command.items() if key not in _EXPLAIN_STRIPPED_FIELDS}
+        explain = await get_client()[database_name].command({"explain": explain_command, "verbosity": "executionStats"})
+    except Exception as e:
+        slow_query_logger.warning("explain of slow %s on %s failed: %s", command_name, collection, e)
+        return
+    examined = _find_docs_examined(explain)
+    if examined is not None:
+        registry.observe_examined(command_name, collection, examined)
+        slow_query_logger.warning("slow %s on %s examined %d documents", command_name, collection, examined)
+
+
+mongo_command_listener = MongoCommandListener()
+
+
+# --- HTTP middleware ---
+
+class MetricsMiddleware:
+    """Times each request, attributes Mongo commands to it and adds a Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if mongo_command_listener.loop is None:
+            mongo_command_listener.loop = asyncio.get_running_loop()
+
+        timings = RequestTimings()
+        token = _current_request.set(timings)
+        started = time.perf_counter()
+        status = 500
+        response_bytes = 0
+
+        async def send_with_timing(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if server_timing_enabled:
+                    MutableHeaders(scope=message).append("Server-Timing", timings.server_timing(time.perf_counter() - started))
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception:
+            logger.exception("Unhandled error on %s %s", scope["method"], scope["path"])
+            raise
+        finally:
+            _current_request.reset(token)
+            # Route templates keep the label set bounded (/employees/{employee_id}, not every id).
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            registry.observe_request(scope["method"], route, status, time.perf_counter() - started, response_bytes)
@@ -0,0 +1,177 @@
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from models.models import SCHEMA_VERSION, STORAGE_FIELDS
+
+# Derived fields maintained on write for indexed lookups (plus the import content hash and
+# the schema version); never returned to clients.
+INTERNAL_FIELDS = ["project_key", "skill_keys", "content_hash", "schema_version"]
+INTERNAL_FIELDS_PROJECTION = {field: 0 for field in INTERNAL_FIELDS}
+
+API_FIELDS = {name: alias for alias, name in STORAGE_FIELDS.items()}
+# Columns computed per response rather than stored, with the stored field each one needs
+COMPUTED_FIELDS = {"Countdown": "resource_end_date"}
+
+_DATE_FORMATS = ["%d/%m/%Y", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"]
+
+
+def normalize_project_key(project: Any) -> Optional[str]:
+    if not isinstance(project, str):
+        return None
+    return " ".join(project.split()).lower() or None
+
+
+def normalize_skills(value: Any) -> Tuple[List[str], List[str]]:
+    """
+    Returns (display names, case-folded keys) for a Tech Skills value, which may be a
+    list or a comma-separated string. Names are trimmed and de-duplicated ignoring
+    case; both lists stay index-aligned.
+    """
+    if value is None:
+        return [], []
+    items = value.split(",") if isinstance(value, str) else value if isinstance(value, list) else [value]
+    names, keys = [], []
+    for item in items:
+        name = str(item).strip()
+        key = name.casefold()
+        if name and key not in keys:
+            names.append(name)
+            keys.append(key)
+    return names, keys
+
+
+def _text(value: Any) -> Optional[str]:
+    return None if value is None else str(value).strip()
+
+
+def _integer(value: Any) -> Optional[int]:
+    # Raises ValueError for anything that isn't a number, as the import always has.
+    if value is None:
+        return None
+    if value == "":
+        return 0
+    return int(float(value)) if isinstance(value, str) else int(value)
+
+
+def _date(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime) or value is None:
+        return value
+    if isinstance(value, str):
+        for date_format in _DATE_FORMATS:
+            try:
+                return datetime.strptime(value.strip(), date_format)
+            except ValueError:
+                pass
+    return None
+
+
+def _string_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    items = value if isinstance(value, list) else [value]
+    return [str(item).strip() for item in items if item is not None and str(item).strip()]
+
+
+_COERCE: Dict[str, Callable[[Any], Any]] = {
+    "allocation": _integer,
+    "resource_end_date": _date,
+    "open_air_id": _string_list,
+    "tech_skills": lambda value: normalize_skills(value)[0],
+}
+
+
+def add_derived_fields(employee_data: dict) -> dict:
+    # Works for full documents and for partial $set payloads alike.
+    if "project" in employee_data:
+        employee_data["project_key"] = normalize_project_key(employee_data["project"])
+    if "tech_skills" in employee_data:
+        employee_data["tech_skills"], employee_data["skill_keys"] = normalize_skills(employee_data["tech_skills"])
+    return employee_data
+
+
+def to_storage(employee: dict, partial: bool = False) -> dict:
+    """
+    Converts an API-shaped employee (aliased field names, loose types) to a stored
+    document: canonical names, strict types and derived fields. Unknown and computed
+    keys are dropped. A `partial` payload only converts the fields it contains.
+    """
+    document = {}
+    for alias, name in STORAGE_FIELDS.items():
+        if alias in employee or not partial:
+            document[name] = _COERCE.get(name, _text)(employee.get(alias))
+    add_derived_fields(document)
+    if not partial:
+        document["schema_version"] = SCHEMA_VERSION
+    return document
+
+
+def to_api(document: dict) -> dict:
+    # Documents the migration hasn't reached yet already use the API names and pass through;
+    # one edited before it was migrated has both, and the canonical field is the newer one.
+    employee = {}
+    for key, value in document.items():
+        if key in INTERNAL_FIELDS:
+            continue
+        if key in API_FIELDS:
+            employee[API_FIELDS[key]] = value
+        elif key not in employee:
+            employee[key] = value
+    return employee
+
+
+def upgrade_document(document: dict) -> dict:
+    """Rewrites a schema version 1 document (API names as stored names) in the current schema."""
+    employee = {}
+    for alias, name in STORAGE_FIELDS.items():
+        # A document edited through the API mid-migration has both; the newer field wins.
+        if name in document:
+            employee[alias] = document[name]
+        elif alias in document:
+            employee[alias] = document[alias]
+    extra = {
+        key: value for key, value in document.items()
+        if key not in STORAGE_FIELDS and key not in API_FIELDS and key not in INTERNAL_FIELDS and key not in COMPUTED_FIELDS
+    }
+    return {**extra, **to_storage(employee)}
+
+
+def storage_field(field: str) -> str:
+    return STORAGE_FIELDS.get(field, field)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parses a comma-separated `fields` parameter of API column names; None selects every
+    field. Raises ValueError for names that aren't columns.
+    """
+    if fields is None:
+        return None
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in STORAGE_FIELDS and field not in COMPUTED_FIELDS and field != "_id"]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+
+def storage_projection(fields: Optional[List[str]]) -> dict:
+    if fields is None:
+        return INTERNAL_FIELDS_PROJECTION
+    projection = {STORAGE_FIELDS[field]: 1 for field in fields if field in STORAGE_FIELDS}
+    projection.update({COMPUTED_FIELDS[field]: 1 for field in fields if field in COMPUTED_FIELDS})
+    return projection or {"_id": 1}
+
+
+def select_fields(employee: dict, fields: Optional[List[str]]) -> dict:
+    # Drops columns that were only fetched to compute another one (the end date behind Countdown).
+    if fields is None:
+        return employee
+    return {key: value for key, value in employee.items() if key == "_id" or key in fields}
+
+
+def project_filter(value: str, match: str = "contains") -> dict:
+    key = normalize_project_key(value) or ""
+    if match == "contains":
+        return {"project_key": {"$regex": re.escape(key)}}
+    # An anchored, case-sensitive regex on the lowercased key is answered from the index.
+    return {"project_key": {"$regex": "^" + re.escape(key)}}
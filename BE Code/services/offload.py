@@ -0,0 +1,93 @@
+import asyncio
+import contextvars
+import functools
+import math
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Optional
+
+from fastapi import HTTPException
+
+from config.config import cpu_pool_workers, cpu_job_limit, cpu_job_queue_timeout
+
+_executor: Optional[ThreadPoolExecutor] = None
+_job_slots = asyncio.Semaphore(max(1, cpu_job_limit))
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, cpu_pool_workers), thread_name_prefix="cpu-pool")
+    return _executor
+
+
+def shutdown_cpu_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+
+
+async def run_cpu(func: Callable[..., Any], *args) -> Any:
+    # Like asyncio.to_thread, but on the bounded pool so heavy jobs can't take every default thread.
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_get_executor(), functools.partial(context.run, func, *args))
+
+
+class CpuJobSlot:
+    """One of the cpu_job_limit slots; release() is safe to call more than once."""
+
+    def __init__(self):
+        self._held = True
+
+    def release(self):
+        if self._held:
+            self._held = False
+            _job_slots.release()
+
+
+async def acquire_cpu_slot() -> CpuJobSlot:
+    if _job_slots.locked():
+        try:
+            if cpu_job_queue_timeout <= 0:
+                raise asyncio.TimeoutError
+            await asyncio.wait_for(_job_slots.acquire(), cpu_job_queue_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many exports/imports in progress, please retry shortly",
+                headers={"Retry-After": str(max(1, math.ceil(cpu_job_queue_timeout)))}
+            )
+    else:
+        await _job_slots.acquire()
+    return CpuJobSlot()
+
+
+@asynccontextmanager
+async def queued_cpu_job() -> AsyncIterator[CpuJobSlot]:
+    # Background jobs wait for a slot instead of being rejected.
+    await _job_slots.acquire()
+    slot = CpuJobSlot()
+    try:
+        yield slot
+    finally:
+        slot.release()
+
+
+@asynccontextmanager
+async def cpu_job() -> AsyncIterator[CpuJobSlot]:
+    slot = await acquire_cpu_slot()
+    try:
+        yield slot
+    finally:
+        slot.release()
+
+
+async def release_when_done(iterator: AsyncIterator[bytes], slot: CpuJobSlot) -> AsyncIterator[bytes]:
+    # Streaming responses keep working after the handler returns, so the slot goes with the body.
+    try:
+        async for chunk in iterator:
+            yield chunk
+    finally:
+        slot.release()
@@ -0,0 +1,116 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+import pymongo
+from bson import ObjectId, json_util
+
+from services.normalize import storage_field
+
+# The records table sorts on display-only columns; map them onto the stored field they follow.
+SORT_FIELD_ALIASES = {"fullName": "first_name", "Countdown": "resource_end_date"}
+
+# Keyset pagination needs a single comparable value per document, so array fields are excluded.
+KEYSET_SORT_FIELDS = {
+    "first_name", "last_name", "allocation", "project", "job_title", "stream",
+    "contract_perm", "resource_end_date", "location", "line_manager", "billable"
+}
+
+# MongoDB's cross-type sort order (null and missing sort first), as $type aliases.
+_TYPE_ORDER = ["number", "string", "object", "array", "binData", "objectId", "bool", "date", "timestamp", "regex"]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def resolve_sort_field(sort_by: Optional[str]) -> str:
+    # Clients sort by API column names; documents are sorted by their stored names.
+    sort_by = sort_by or "First name"
+    return SORT_FIELD_ALIASES.get(sort_by) or storage_field(sort_by)
+
+
+def sort_spec(sort_field: str, direction: int) -> List[Tuple[str, int]]:
+    # _id breaks ties so rows with equal sort keys keep a stable order across pages.
+    return [(sort_field, direction), ("_id", direction)]
+
+
+def filter_fingerprint(*params: Any) -> str:
+    return hashlib.sha1(json.dumps(params, default=str).encode()).hexdigest()[:16]
+
+
+def encode_cursor(last_doc: dict, sort_field: str, direction: int, fingerprint: str, total: Optional[int]) -> str:
+    payload = {
+        "v": last_doc.get(sort_field),
+        "id": last_doc["_id"],
+        "s": sort_field,
+        "d": direction,
+        "f": fingerprint,
+        "t": total
+    }
+    raw = json_util.dumps(payload).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort_field: str, direction: int, fingerprint: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(payload, dict) or "v" not in payload:
+        raise InvalidCursor("Invalid cursor")
+    if payload.get("s") != sort_field or payload.get("d") != direction or payload.get("f") != fingerprint:
+        raise InvalidCursor("Cursor does not match the current filters or sort order")
+    if not isinstance(payload.get("id"), ObjectId):
+        raise InvalidCursor("Invalid cursor")
+    if payload.get("t") is not None and (not isinstance(payload["t"], int) or isinstance(payload["t"], bool)):
+        raise InvalidCursor("Invalid cursor")
+    if payload["v"] is not None:
+        # Raises InvalidCursor for a sort value keyset_filter can't place.
+        _type_alias(payload["v"])
+    return payload
+
+
+def _type_alias(value: Any) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, datetime):
+        return "date"
+    if isinstance(value, ObjectId):
+        return "objectId"
+    raise InvalidCursor("Invalid cursor")
+
+
+def keyset_filter(sort_field: str, direction: int, last_value: Any, last_id: ObjectId) -> dict:
+    """
+    Matches every document that sorts after (last_value, last_id). Range operators in
+    MongoDB only compare within one BSON type, so documents of later types are matched
+    explicitly to follow the server's cross-type sort order.
+    """
+    ascending = direction == pymongo.ASCENDING
+    id_after = {"$gt" if ascending else "$lt": last_id}
+
+    if last_value is None:
+        conditions = [{sort_field: None, "_id": id_after}]
+        if ascending:
+            conditions.append({sort_field: {"$ne": None}})
+        return {"$or": conditions}
+
+    position = _TYPE_ORDER.index(_type_alias(last_value))
+    conditions = [
+        {sort_field: {"$gt" if ascending else "$lt": last_value}},
+        {sort_field: last_value, "_id": id_after}
+    ]
+    following_types = _TYPE_ORDER[position + 1:] if ascending else _TYPE_ORDER[:position]
+    if following_types:
+        conditions.append({sort_field: {"$type": following_types}})
+    if not ascending:
+        conditions.append({sort_field: None})
+    return {"$or": conditions}
@@ -0,0 +1,119 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from db.db import list_read_collection
+
+PLANNER_PROJECTION = {"_id": 0, "allocation": 1, "resource_end_date": 1, "project": 1, "stream": 1, "billable": 1}
+_BILLABLE_VALUES = {"yes", "y", "true", "billable"}
+
+
+class RosterColumns:
+    """
+    The roster as parallel arrays, one entry per employee. Allocation is a fraction
+    of one FTE capped at 1; a missing end date means the assignment doesn't end.
+    """
+
+    def __init__(self, documents: List[dict]):
+        self.count = len(documents)
+        allocation = np.array(
+            [doc.get("allocation") if isinstance(doc.get("allocation"), (int, float)) else 0 for doc in documents],
+            dtype=np.float64
+        )
+        self.allocation = np.clip(allocation, 0, 100) / 100
+        self.end_date = np.array(
+            [doc["resource_end_date"] if isinstance(doc.get("resource_end_date"), datetime) else None for doc in documents],
+            dtype="datetime64[D]"
+        )
+        self.billable = np.array(
+            [isinstance(doc.get("billable"), str) and doc["billable"].strip().lower() in _BILLABLE_VALUES for doc in documents],
+            dtype=bool
+        )
+        self.streams, self.stream_codes = self._encode([doc.get("stream") for doc in documents])
+        self.projects, self.project_codes = self._encode([doc.get("project") for doc in documents])
+
+    @staticmethod
+    def _encode(values: List[Optional[str]]):
+        # Group labels -> (distinct labels, per-employee code); None stays its own group.
+        labels: Dict[Optional[str], int] = {}
+        codes = np.fromiter((labels.setdefault(value, len(labels)) for value in values), dtype=np.int64, count=len(values))
+        return list(labels), codes
+
+
+async def load_roster() -> List[dict]:
+    return await list_read_collection.find({}, PLANNER_PROJECTION).to_list(length=None)
+
+
+def _grouped_step_sums(codes: np.ndarray, groups: int, roll_off: np.ndarray, weights: np.ndarray, weeks: int) -> np.ndarray:
+    """
+    For each group and week w, the sum of `weights` over members still assigned in
+    week w (roll_off > w). Each employee contributes one step function, so this is
+    the group total minus a cumulative sum of what rolls off: O(employees + groups x weeks).
+    """
+    totals = np.bincount(codes, weights=weights, minlength=groups)
+    rolled_off = np.bincount(codes * (weeks + 1) + roll_off, weights=weights, minlength=groups * (weeks + 1))
+    rolled_off = np.cumsum(rolled_off.reshape(groups, weeks + 1), axis=1)[:, :weeks]
+    return totals[:, None] - rolled_off
+
+
+def _series(values: np.ndarray) -> list:
+    return np.round(values, 2).tolist()
+
+
+def project_capacity(roster: RosterColumns, today: datetime, weeks: int) -> dict:
+    """
+    Week-by-week capacity from `today`: allocated and available FTE per stream and
+    per project (grouped by where people are now), the bench (people with nothing
+    allocated) and the billable share of headcount. Someone's allocation lasts until
+    their end date and is free from the first week starting on or after it.
+    """
+    week_starts = np.datetime64(today.date(), "D") + np.arange(weeks) * 7
+    # First week index in which each employee is no longer allocated (weeks = never within range).
+    ends = np.where(np.isnat(roster.end_date), week_starts[-1] + 7, roster.end_date)
+    roll_off = np.searchsorted(week_starts, ends, side="left").astype(np.int64)
+
+    everyone = np.zeros(roster.count, dtype=np.int64)
+    allocated_total = _grouped_step_sums(everyone, 1, roll_off, roster.allocation, weeks)[0]
+    billable_fte = _grouped_step_sums(everyone, 1, roll_off, roster.allocation * roster.billable, weeks)[0]
+    # Fully unallocated people are on the bench every week; the rest join it as they roll off.
+    assigned = (roster.allocation > 0).astype(np.float64)
+    bench = roster.count - _grouped_step_sums(everyone, 1, roll_off, assigned, weeks)[0]
+
+    def by_group(labels: List[Optional[str]], codes: np.ndarray) -> List[dict]:
+        headcount = np.bincount(codes, minlength=len(labels))
+        allocated = _grouped_step_sums(codes, len(labels), roll_off, roster.allocation, weeks)
+        order = np.argsort(-headcount, kind="stable")
+        return [
+            {
+                "name": labels[group],
+                "headcount": int(headcount[group]),
+                "allocatedFte": _series(allocated[group]),
+                "availableFte": _series(headcount[group] - allocated[group]),
+            }
+            for group in order
+        ]
+
+    headcount = roster.count
+    return {
+        "asOf": today.strftime("%Y-%m-%d"),
+        "weeks": [str(week) for week in week_starts],
+        "totals": {
+            "headcount": headcount,
+            "allocatedFte": _series(allocated_total),
+            "availableFte": _series(headcount - allocated_total),
+            "bench": _series(bench),
+            "billableFte": _series(billable_fte),
+            "billableRatio": _series(billable_fte / headcount if headcount else np.zeros(weeks)),
+        },
+        "byStream": by_group(roster.streams, roster.stream_codes),
+        "byProject": by_group(roster.projects, roster.project_codes),
+    }
+
+
+def plan_capacity(documents: List[dict], today: datetime, weeks: int) -> dict:
+    return project_capacity(RosterColumns(documents), today, weeks)
+
+
+def weeks_for_months(months: int) -> int:
+    return max(1, round(months * 52 / 12))
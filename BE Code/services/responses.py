@@ -0,0 +1,157 @@
+import hashlib
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config.config import brotli_quality, compression_minimum_size, etag_enabled, gzip_compress_level
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+# Streams must go out as they are produced, and xlsx is already a zip container.
+UNCOMPRESSED_CONTENT_TYPES = (
+    "text/event-stream",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    # orjson writes datetimes in the same ISO format as jsonable_encoder.
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MongoJSONResponse(ORJSONResponse):
+    """
+    Serializes documents straight from Mongo (ObjectId, datetime) with orjson. Routes
+    that return it directly also skip FastAPI's response validation and
+    jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# --- HTTP middleware ---
+
+def _accepted_encodings(header: str) -> set:
+    encodings = set()
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+class _ExcludingResponder(IdentityResponder):
+    async def send_with_compression(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            await super().send_with_compression(message)
+            self.content_type_is_excluded = content_type.startswith(UNCOMPRESSED_CONTENT_TYPES)
+            return
+        await super().send_with_compression(message)
+
+
+class _GZipResponder(_ExcludingResponder, GZipResponder):
+    pass
+
+
+class _BrotliResponder(_ExcludingResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        # Flushing each chunk keeps streamed responses (CSV exports) flowing.
+        compressed = self.compressor.process(body)
+        return compressed + (self.compressor.flush() if more_body else self.compressor.finish())
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least `compression_minimum_size` bytes with brotli
+    (when installed and accepted) or gzip; event streams and xlsx files are left alone.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = _accepted_encodings(Headers(scope=scope).get("Accept-Encoding", ""))
+        if brotli is not None and "br" in accepted:
+            responder = _BrotliResponder(self.app, compression_minimum_size, brotli_quality)
+        elif "gzip" in accepted:
+            responder = _GZipResponder(self.app, compression_minimum_size, compresslevel=gzip_compress_level)
+        else:
+            responder = _ExcludingResponder(self.app, compression_minimum_size)
+        await responder(scope, receive, send)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison, as If-None-Match requires.
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in candidates)
+
+
+class ETagMiddleware:
+    """
+    Adds an ETag to successful JSON GET responses sent in one piece and answers a
+    matching If-None-Match with 304, so a client polling an unchanged page or
+    dashboard skips the download. The tag is weak because compression happens later.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not etag_enabled or scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("If-None-Match")
+        start_message = None
+
+        async def send_with_etag(message: Message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if message["status"] == 200 and "etag" not in headers and headers.get("content-type", "").startswith("application/json"):
+                    # Held back until the body shows whether it arrives in one piece.
+                    start_message = message
+                    return
+            elif message["type"] == "http.response.body" and start_message is not None:
+                start, start_message = start_message, None
+                if not message.get("more_body", False):
+                    body = message.get("body", b"")
+                    etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+                    headers = MutableHeaders(raw=start["headers"])
+                    headers["ETag"] = etag
+                    if if_none_match and _etag_matches(if_none_match, etag):
+                        start["status"] = 304
+                        del headers["Content-Length"]
+                        del headers["Content-Type"]
+                        message = {"type": "http.response.body", "body": b""}
+                await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,26 @@
+import logging
+
+from pymongo.errors import PyMongoError
+
+from db.db import meta_collection
+
+logger = logging.getLogger(__name__)
+
+_ROSTER_VERSION = "roster_version"
+
+
+async def mark_roster_changed():
+    """
+    Bumps the roster change counter. Every write path to list_collection calls this
+    after writing; cached results and polling feeds in every worker compare against it.
+    """
+    try:
+        await meta_collection.update_one({"_id": _ROSTER_VERSION}, {"$inc": {"version": 1}}, upsert=True)
+    except PyMongoError:
+        # The write itself went through; readers pick it up with the next change.
+        logger.exception("Could not bump the roster change counter")
+
+
+async def roster_version() -> int:
+    marker = await meta_collection.find_one({"_id": _ROSTER_VERSION})
+    return marker["version"] if marker else 0
@@ -0,0 +1,98 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+from db.db import list_collection, skill_counts_collection
+from db.indexes import SKILL_COUNTS_INDEXES
+from services.normalize import normalize_skills, to_api
+
+DISTRIBUTION_STREAMS = ["Frontend", "Backend", "QA"]
+
+logger = logging.getLogger(__name__)
+
+
+def _skill_entries(employee: Optional[dict]) -> Dict[Tuple[Optional[str], str], str]:
+    # Maps (stream, skill key) -> display name for one employee document.
+    if not employee:
+        return {}
+    # Through to_api so documents the schema migration hasn't reached yet are read the same way.
+    employee = to_api(employee)
+    names, keys = normalize_skills(employee.get("Tech Skills"))
+    stream = employee.get("Stream")
+    return {(stream, key): name for key, name in zip(keys, names)}
+
+
+async def apply_skill_deltas(changes: Iterable[Tuple[Optional[dict], Optional[dict]]]):
+    """
+    Adjusts the materialized counts for employees going from `before` to `after`, netted
+    per (stream, skill) into one bulk write. The roster write has already happened by the
+    time this runs, so a failure here is logged rather than raised; POST
+    /skill-distribution/recount repairs the drift.
+    """
+    deltas: Dict[Tuple[Optional[str], str], int] = {}
+    names: Dict[Tuple[Optional[str], str], str] = {}
+    for before, after in changes:
+        old_entries = _skill_entries(before)
+        new_entries = _skill_entries(after)
+        for entry, name in new_entries.items():
+            if entry not in old_entries:
+                deltas[entry] = deltas.get(entry, 0) + 1
+                names.setdefault(entry, name)
+        for entry in old_entries:
+            if entry not in new_entries:
+                deltas[entry] = deltas.get(entry, 0) - 1
+
+    operations = []
+    for (stream, key), delta in deltas.items():
+        if delta > 0:
+            operations.append(UpdateOne(
+                {"_id": {"stream": stream, "skill": key}},
+                {"$inc": {"count": delta}, "$setOnInsert": {"stream": stream, "skill": key, "name": names[(stream, key)]}},
+                upsert=True
+            ))
+        elif delta < 0:
+            operations.append(UpdateOne({"_id": {"stream": stream, "skill": key}}, {"$inc": {"count": delta}}))
+
+    if operations:
+        try:
+            await skill_counts_collection.bulk_write(operations, ordered=False)
+        except PyMongoError:
+            logger.exception("Updating the skill counts failed; they drift until the next recount")
+
+
+async def apply_skill_delta(before: Optional[dict], after: Optional[dict]):
+    """Adjusts the materialized counts for one employee going from `before` to `after`."""
+    await apply_skill_deltas([(before, after)])
+
+
+async def rebuild_skill_counts():
+    # Full recount on the server, for startup and the admin repair. Its $out swaps the
+    # collection, so $inc's that land while it runs are lost; every write path applies deltas instead.
+    pipeline = [
+        {"$match": {"skill_keys.0": {"$exists": True}}},
+        {"$project": {"stream": 1, "pairs": {"$zip": {"inputs": ["$skill_keys", "$tech_skills"]}}}},
+        {"$unwind": "$pairs"},
+        {"$group": {
+            "_id": {"stream": "$stream", "skill": {"$arrayElemAt": ["$pairs", 0]}},
+            "name": {"$first": {"$arrayElemAt": ["$pairs", 1]}},
+            "count": {"$sum": 1}
+        }},
+        {"$addFields": {"stream": "$_id.stream", "skill": "$_id.skill"}},
+        {"$out": skill_counts_collection.name}
+    ]
+    await list_collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+    await skill_counts_collection.create_indexes(SKILL_COUNTS_INDEXES)
+
+
+async def get_skill_counts(streams: List[str] = DISTRIBUTION_STREAMS) -> List[dict]:
+    cursor = skill_counts_collection.find(
+        {"stream": {"$in": streams}, "count": {"$gt": 0}},
+        {"_id": 0, "stream": 1, "name": 1, "count": 1}
+    ).sort([("stream", ASCENDING), ("count", DESCENDING)])
+
+    by_stream: Dict[str, List[dict]] = {}
+    async for entry in cursor:
+        by_stream.setdefault(entry["stream"], []).append({"name": entry["name"], "count": entry["count"]})
+    return [{"stream": stream, "skills": skills} for stream, skills in by_stream.items()]
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from config.config import snapshot_interval_minutes
+from db.db import list_read_collection, snapshots_collection
+from db.migrations import wait_for_migrations
+from services.cache import next_midnight
+from services.dashboard import compute_dashboard_summary
+
+logger = logging.getLogger(__name__)
+
+# Allocation bands by lower bound, in percent; anything from 101 up is over-allocated.
+ALLOCATION_BANDS = [(0, "0%"), (1, "1-49%"), (50, "50-99%"), (100, "100%")]
+OVER_ALLOCATED = "Over 100%"
+# How long a worker may take to compute a snapshot before another one may try again
+_REFRESH_LEASE = timedelta(minutes=10)
+# A document that only holds a lease (the first refresh of the day) isn't a snapshot yet.
+_TAKEN = {"kpis": {"$exists": True}}
+
+_snapshot_task: Optional[asyncio.Task] = None
+
+
+def _today() -> datetime:
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def compute_allocation_bands() -> List[dict]:
+    pipeline = [
+        {"$match": {"allocation": {"$type": "number"}}},
+        {"$bucket": {
+            "groupBy": "$allocation",
+            "boundaries": [bound for bound, _ in ALLOCATION_BANDS] + [101],
+            "default": OVER_ALLOCATED,
+            "output": {"count": {"$sum": 1}}
+        }},
+    ]
+    counts = {bucket["_id"]: bucket["count"] for bucket in await list_read_collection.aggregate(pipeline).to_list(length=None)}
+    # Every band is listed, empty ones included, so consecutive snapshots line up.
+    return [{"name": name, "value": counts.get(bound, 0)} for bound, name in ALLOCATION_BANDS] + \
+        [{"name": OVER_ALLOCATED, "value": counts.get(OVER_ALLOCATED, 0)}]
+
+
+async def take_snapshot(today: Optional[datetime] = None) -> dict:
+    """Writes (or rewrites) the rollup for `today`: the dashboard summary plus allocation bands."""
+    today = today or _today()
+    summary, allocation_bands = await asyncio.gather(compute_dashboard_summary(today), compute_allocation_bands())
+    snapshot = {
+        "_id": today,
+        "taken_at": datetime.now(),
+        **summary,
+        "allocationBands": allocation_bands,
+    }
+    await snapshots_collection.replace_one({"_id": today}, snapshot, upsert=True)
+    return snapshot
+
+
+async def get_snapshot(day: datetime) -> Optional[dict]:
+    return await snapshots_collection.find_one({"_id": day, **_TAKEN})
+
+
+def snapshot_summary(snapshot: dict) -> dict:
+    # The /dashboard-summary shape, as of when the snapshot was taken.
+    return {key: snapshot[key] for key in ("kpis", "charts", "atRiskEmployees")}
+
+
+async def get_trends(start: datetime, end: datetime) -> List[dict]:
+    # The at-risk names only matter for today's dashboard; trends are counts.
+    cursor = snapshots_collection.find(
+        {"_id": {"$gte": start, "$lte": end}, **_TAKEN}, {"atRiskEmployees": 0, "lease_until": 0}
+    ).sort("_id", 1)
+    return [
+        {"date": snapshot.pop("_id").strftime("%Y-%m-%d"), **snapshot}
+        async for snapshot in cursor
+    ]
+
+
+async def _claim_refresh(today: datetime) -> bool:
+    """
+    Takes the lease on today's refresh if the snapshot is due and nobody holds it. The
+    upsert creates the day's document when there is none yet; when one exists but isn't
+    due or is leased, the upsert collides with it and another worker has it covered.
+    """
+    now = datetime.now()
+    due = {"$or": [{"taken_at": {"$exists": False}}, {"taken_at": {"$lt": now - timedelta(minutes=snapshot_interval_minutes)}}]}
+    free = {"$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lt": now}}]}
+    try:
+        await snapshots_collection.update_one(
+            {"_id": today, "$and": [due, free]}, {"$set": {"lease_until": now + _REFRESH_LEASE}}, upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def refresh_snapshot():
+    # Every worker runs this loop; only the one that claims the lease computes the snapshot.
+    today = _today()
+    if not await _claim_refresh(today):
+        return
+    try:
+        await take_snapshot(today)
+    except BaseException:
+        # Lets the next worker to wake up retry instead of waiting out the lease.
+        await snapshots_collection.update_one({"_id": today}, {"$unset": {"lease_until": ""}})
+        raise
+
+
+async def _snapshot_forever():
+    # A snapshot taken mid-migration would leave out the documents still in the old schema
+    # and be served for the rest of the interval.
+    await wait_for_migrations()
+    while True:
+        try:
+            await refresh_snapshot()
+        except Exception:
+            logger.exception("Daily snapshot failed")
+        now = datetime.now()
+        # Wake just after midnight too, so each day's snapshot starts from that day's data.
+        await asyncio.sleep(min(snapshot_interval_minutes * 60, (next_midnight(now) - now).total_seconds() + 1))
+
+
+def start_snapshots():
+    global _snapshot_task
+    if snapshot_interval_minutes > 0:
+        _snapshot_task = asyncio.create_task(_snapshot_forever())
+
+
+async def stop_snapshots():
+    if _snapshot_task and not _snapshot_task.done():
+        _snapshot_task.cancel()
+        try:
+            await _snapshot_task
+        except asyncio.CancelledError:
+            pass
@@ -15,7 +15,7 @@ import {
 } from 'recharts';
 import { Briefcase, Users, AlertTriangle, FileText } from 'lucide-react';
 import Layout from '../components/Layout';
-import { getDashboardSummary } from '../utils/api';
+import { getDashboardSummary, subscribeToLiveUpdates } from '../utils/api';
 import { Auth } from '../utils/auth';
 
 // --- Reusable UI Components ---
@@ -82,6 +82,10 @@ export default function DashboardPage() {
       }
     };
     fetchDashboardData();
+
+    // The server pushes the recomputed summary whenever the roster changes.
+    const applySummary = ({ summary }) => setDashboardData(summary);
+    return subscribeToLiveUpdates({ onSnapshot: applySummary, onChanges: applySummary });
   }, [navigate]);
 
   if (isLoading) { return <Layout><div className="p-8 text-center text-gray-500">Loading dashboard...</div></Layout>; }
@@ -7,7 +7,7 @@ import Pagination from './Pagination';
 import ConfirmationModal from './ConfirmationModal';
 import './RecordsPage.css';
 import {
-  getRecords, getRecordsCount, createRecord, updateRecord, deleteRecord, importFromJSONFile, exportToExcel
+  getRecord, getRecordsPage, createRecord, updateRecord, deleteRecord, importFromJSONFile, exportToExcel, subscribeToLiveUpdates
 } from '../utils/api';
 
 const displaySchema = {
@@ -15,6 +15,8 @@ const displaySchema = {
     { "name": "fullName", "label": "Name" }, { "name": "% Allocation", "label": "Allocation %" }, { "name": "Project", "label": "Project" }, { "name": "Open Air ID", "label": "Open Air ID" }, { "name": "Job Title", "label": "Job Title" }, { "name": "Stream", "label": "Stream" }, { "name": "Contract / Perm", "label": "Contract / Perm" }, { "name": "Resource End date", "label": "End Date" ,  "type": "date" }, { "name": "Countdown", "label": "Countdown" }
   ]
 };
+// The table only needs its own columns; "fullName" is built from the two name fields.
+const listFields = ["First name", "Last name", ...displaySchema.fields.map(f => f.name).filter(name => name !== "fullName")];
 const formSchema = {
   fields: [
     { "name": "First name", "label": "First Name" }, { "name": "Last name", "label": "Last Name" }, { "name": "Line Manager", "label": "Line Manager" }, { "name": "% Allocation", "label": "Allocation %" }, { "name": "Project", "label": "Project" }, { "name": "Open Air ID", "label": "Open Air ID (comma-separated)" }, { "name": "Location", "label": "Location" }, { "name": "Stream", "label": "Stream" }, { "name": "Tech Skills", "label": "Tech Skills (comma-separated)" }, { "name": "Job Title", "label": "Job Title" }, { "name": "Contract / Perm", "label": "Contract / Perm" }, { "name": "Billable", "label": "Billable" }, { "name": "Resource End date", "label": "End Date", "type": "date" }, { "name": "Countdown", "label": "Countdown" }, { "name": "Notes", "label": "Notes" }
@@ -71,12 +73,9 @@ export default function RecordsPage() {
       setIsLoading(true);
       setError(null);
       try {
-        const [recordsData, countData] = await Promise.all([
-          getRecords(currentPage, recordsPerPage, filters, sortConfig),
-          getRecordsCount(filters)
-        ]);
-        setRecords(recordsData);
-        setTotalRecords(countData);
+        const { items, total } = await getRecordsPage(currentPage, recordsPerPage, filters, sortConfig, listFields);
+        setRecords(items);
+        setTotalRecords(total);
       } catch (err) {
         setError(err.message);
         toast.error(`Failed to fetch data: ${err.message}`);
@@ -88,6 +87,18 @@ export default function RecordsPage() {
     fetchAllData();
   }, [filters, currentPage, recordsPerPage, sortConfig, refetchIndex, location.search, navigate]);
   
+  useEffect(() => {
+    // Edits to rows on this page are patched in; anything that can shift the page refetches it.
+    return subscribeToLiveUpdates({
+      onSnapshot: ({ resync }) => { if (resync) triggerRefetch(); },
+      onChanges: ({ changes, resync }) => {
+        if (resync || changes.some(change => change.op !== 'update')) { triggerRefetch(); return; }
+        const updated = new Map(changes.map(change => [change.id, change.employee]));
+        setRecords(rows => rows.map(row => updated.get(row._id) || row));
+      },
+    });
+  }, []);
+
   const totalPages = Math.ceil(totalRecords / recordsPerPage);
   const columns = useMemo(() => (displaySchema.fields.map(f => f.name)), []);
   const columnLabels = useMemo(() => { const labels = {}; displaySchema.fields.forEach(f => { labels[f.name] = f.label || f.name; }); return labels; }, []);
@@ -184,7 +195,15 @@ export default function RecordsPage() {
   const handleOpenCreateModal = () => { setCurrentRecord(buildEmptyRecord()); setIsModalOpen(true); };
   const handleCloseModal = () => { setIsModalOpen(false); setCurrentRecord(null); };
   
-  const handleOpenEditModal = (recordToEdit) => {
+  const handleOpenEditModal = async (row) => {
+    // Table rows only carry the displayed columns; the form needs the whole record.
+    let recordToEdit;
+    try {
+      recordToEdit = await getRecord(row._id);
+    } catch (err) {
+      toast.error(`Failed to load record: ${err.message}`);
+      return;
+    }
     const cleaned = { ...recordToEdit };
     ["Tech Skills", "Open Air ID"].forEach(f => {
       const value = cleaned[f];
@@ -26,6 +26,35 @@ export async function getRecords(page = 1, limit = 10, filters = {}, sortConfig
   return response.json();
 }
 
+/**
+ * Fetches one page of records together with the total count in a single request.
+ * Pass `fields` to receive only those columns.
+ */
+export async function getRecordsPage(page = 1, limit = 10, filters = {}, sortConfig = {}, fields = null) {
+  const params = new URLSearchParams({
+    skip: (page - 1) * limit,
+    limit: limit,
+    sortBy: sortConfig.key || 'First name',
+    sortDirection: sortConfig.direction || 'ascending',
+    includeTotal: true,
+  });
+  if (fields) {
+    params.append('fields', fields.join(','));
+  }
+
+  for (const key in filters) {
+    if (filters[key]) {
+      params.append(key, filters[key]);
+    }
+  }
+
+  const response = await fetch(`${API_BASE_URL}/employees?${params.toString()}`);
+  if (!response.ok) {
+    throw new Error('Failed to fetch records');
+  }
+  return response.json();
+}
+
 /**
  * Fetches the total count of records based on the current filters.
  */
@@ -46,6 +75,17 @@ export async function getRecordsCount(filters = {}) {
   return data.total;
 }
 
+/**
+ * Fetches a single record with every field.
+ */
+export async function getRecord(id) {
+  const response = await fetch(`${API_BASE_URL}/employees/${id}`);
+  if (!response.ok) {
+    throw new Error('Failed to fetch record');
+  }
+  return response.json();
+}
+
 /**
  * Creates a new record.
  */
@@ -137,6 +177,19 @@ export async function exportToExcel(filters = {}) {
 
 
 
+/**
+ * Subscribes to live updates pushed by the server (Server-Sent Events).
+ * `snapshot` arrives on connect (and after falling behind, with resync set);
+ * `changes` carries row deltas plus the updated dashboard summary.
+ * Returns a function that closes the connection.
+ */
+export function subscribeToLiveUpdates({ onSnapshot, onChanges } = {}) {
+  const source = new EventSource(`${API_BASE_URL}/live`);
+  source.addEventListener('snapshot', (event) => onSnapshot && onSnapshot(JSON.parse(event.data)));
+  source.addEventListener('changes', (event) => onChanges && onChanges(JSON.parse(event.data)));
+  return () => source.close();
+}
+
 export async function getDashboardSummary() {
   const response = await fetch(`${API_BASE_URL}/dashboard-summary`);
   if (!response.ok) {